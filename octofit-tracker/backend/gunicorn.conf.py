@@ -0,0 +1,17 @@
+"""gunicorn settings for the Django backend.
+
+    gunicorn -c gunicorn.conf.py octofit_tracker.wsgi
+
+Each worker warms its Mongo connection pool once the application is
+loaded and before it accepts requests. Under an ASGI worker the
+application's lifespan startup does the same.
+"""
+import os
+
+bind = os.environ.get('OCTOFIT_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('OCTOFIT_WORKERS', '2'))
+
+
+def post_worker_init(worker):
+    from octofit_tracker import pool
+    pool.safe_warmup()
@@ -0,0 +1,109 @@
+"""Filters and ordering for the activity list, planned against its indexes.
+
+``user_id``, ``team_id``, ``activity_type``, ``start``/``end`` (as in the
+stats endpoints), ``min_duration`` and ``min_calories`` narrow the list;
+``ordering`` picks one of ``ORDERINGS``. Every request is planned against
+the indexes declared on ``Activity``: the chosen index starts with some of
+the equality filters and ends with the sort field and ``_id``, so pages
+are read in index order. Filters that index does not cover are checked
+against the entries it scans. When no index bounds the scan at all, the
+request would walk every activity and is rejected. Otherwise the
+uncovered filters are reported in the ``X-Unindexed-Filters`` header.
+"""
+from rest_framework.exceptions import ValidationError
+
+from . import stats
+from .models import Activity
+
+ORDERINGS = ('-date', 'date', '-calories', 'calories')
+EQUALITY_FIELDS = ('user_id', 'activity_type')
+MINIMUMS = {'min_duration': 'duration', 'min_calories': 'calories'}
+OPERATORS = {'$in': 'in', '$gte': 'gte', '$lt': 'lt'}
+
+
+def parse(params):
+    """Read and validate the list filters and ordering from query params"""
+    filters = stats.parse_filters(params)
+    filters.pop('period')
+    for name in MINIMUMS:
+        filters[name] = _parse_minimum(params, name)
+    ordering = params.get('ordering') or ORDERINGS[0]
+    if ordering not in ORDERINGS:
+        raise ValidationError({'ordering': [f"Must be one of: {', '.join(ORDERINGS)}."]})
+    filters['ordering'] = ordering
+    return filters
+
+
+def _parse_minimum(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: ['Expected an integer.']})
+
+
+def keyset_ordering(ordering):
+    """The paginator ordering for an ``ORDERINGS`` value, with ``_id`` breaking ties"""
+    return (ordering, '-_id' if ordering.startswith('-') else '_id')
+
+
+def plan(filters):
+    """
+    Pick the declared index serving these filters.
+
+    Returns the index name and the sorted fields it leaves to be checked
+    per scanned entry; raises ValidationError when nothing bounds the scan.
+    """
+    sort_field = filters['ordering'].lstrip('-')
+    equality = {field for field in EQUALITY_FIELDS if filters[field]}
+    if filters['team_id']:
+        equality.add('user_id')
+    ranges = {field for name, field in MINIMUMS.items() if filters[name] is not None}
+    if filters['start'] or filters['end']:
+        ranges.add('date')
+
+    best = None
+    for index in Activity._meta.indexes:
+        fields = list(index.fields)
+        prefix = set(fields[:-2])
+        if fields[-2:] != [sort_field, '_id'] or not prefix <= equality:
+            continue
+        if best is None or len(prefix) > len(best[1]):
+            best = (index.name, prefix)
+    if best is None:
+        raise ValidationError({'ordering': [f'No index serves ordering by {sort_field}.']})
+
+    name, prefix = best
+    residual = sorted((equality - prefix) | (ranges - {sort_field}))
+    if residual and not prefix and sort_field not in ranges:
+        raise ValidationError({'non_field_errors': [
+            f"Filtering on {', '.join(residual)} ordered by {sort_field} would scan every activity; "
+            'no index covers this combination.'
+        ]})
+    return name, residual
+
+
+def to_query(filters):
+    """The Mongo filter selecting the matching activities"""
+    query = stats.match_stage(
+        start=filters['start'], end=filters['end'], user_id=filters['user_id'],
+        team_id=filters['team_id'], activity_type=filters['activity_type'],
+    )['$match']
+    for name, field in MINIMUMS.items():
+        if filters[name] is not None:
+            query[field] = {'$gte': filters[name]}
+    return query
+
+
+def filter_queryset(queryset, filters):
+    """Apply ``to_query`` to an ORM queryset"""
+    lookups = {}
+    for field, condition in to_query(filters).items():
+        if isinstance(condition, dict):
+            for operator, value in condition.items():
+                lookups[f'{field}__{OPERATORS[operator]}'] = value
+        else:
+            lookups[field] = condition
+    return queryset.filter(**lookups)
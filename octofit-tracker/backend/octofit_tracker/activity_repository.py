@@ -0,0 +1,72 @@
+"""Direct pymongo access to the activities collection.
+
+The ORM sends every activity query through djongo's SQL parser and
+translator. These functions build the Mongo commands themselves and
+return ``.values()``-style rows keyed by field name, which the activity
+serializer's fast path renders exactly as it renders ORM rows. Writes
+keep the collection version and the derived collections in step, as the
+ORM path's signal and ``perform_create`` do.
+"""
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from . import aggregates, versions
+from .models import Activity
+from .mongo import get_collection, to_document
+
+
+def get_columns(names=None):
+    """Map field names (all concrete fields by default) to their columns"""
+    fields = Activity._meta.concrete_fields
+    if names is not None:
+        fields = [Activity._meta.get_field(name) for name in names]
+    return {field.name: field.column for field in fields}
+
+
+def to_row(document, columns):
+    return {name: document.get(column) for name, column in columns.items()}
+
+
+def find(query=None, names=None, sort=None, limit=None):
+    """Rows matching a Mongo filter, with only the ``names`` fields fetched"""
+    columns = get_columns(names)
+    cursor = get_collection(Activity).find(query or {}, {column: 1 for column in columns.values()})
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return [to_row(document, columns) for document in cursor]
+
+
+def paginate(paginator, request, query=None, names=None):
+    """One keyset page of rows matching ``query``"""
+    def fetch(page_query, sort, limit):
+        return find(_and(query, page_query), names, sort, limit)
+    return paginator.paginate_collection(fetch, request, Activity)
+
+
+def get(object_id, names=None):
+    """The row with this id, or None when there is none or the id is malformed"""
+    try:
+        object_id = ObjectId(object_id)
+    except (InvalidId, TypeError):
+        return None
+    columns = get_columns(names)
+    document = get_collection(Activity).find_one({'_id': object_id}, {column: 1 for column in columns.values()})
+    return None if document is None else to_row(document, columns)
+
+
+def create(validated_data):
+    """Insert one validated activity and return its row"""
+    document = to_document(Activity(**validated_data))
+    get_collection(Activity).insert_one(document)
+    versions.bump(Activity)
+    aggregates.record_activities(added=[document])
+    return to_row(document, get_columns())
+
+
+def _and(*queries):
+    queries = [query for query in queries if query]
+    if len(queries) > 1:
+        return {'$and': queries}
+    return queries[0] if queries else {}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Team, Activity, Leaderboard, Workout
+from .models import User, Team, Activity, Leaderboard, TeamLeaderboard, Workout
 
 
 @admin.register(User)
@@ -84,6 +84,24 @@ class LeaderboardAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(TeamLeaderboard)
+class TeamLeaderboardAdmin(admin.ModelAdmin):
+    """Admin configuration for the TeamLeaderboard model"""
+    list_display = ['rank', 'team_name', 'member_count', 'total_calories', 'total_activities', 'total_distance']
+    search_fields = ['team_name']
+    readonly_fields = ['_id']
+    ordering = ['rank']
+
+    fieldsets = (
+        ('Leaderboard Information', {
+            'fields': ('_id', 'rank', 'team_id', 'team_name', 'member_count')
+        }),
+        ('Statistics', {
+            'fields': ('total_calories', 'total_activities', 'total_distance')
+        }),
+    )
+
+
 @admin.register(Workout)
 class WorkoutAdmin(admin.ModelAdmin):
     """Admin configuration for the Workout model"""
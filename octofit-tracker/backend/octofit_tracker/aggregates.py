@@ -0,0 +1,39 @@
+"""Collections derived from activities, kept in step with activity writes.
+
+Every code path that writes activities reports them here once, and each
+derived collection applies its own incremental update.
+"""
+from . import leaderboard, leaderboard_periods, rollups, team_leaderboard
+
+# Past this many affected users a full rebuild beats per-user recomputation
+RECOMPUTE_LIMIT = 10000
+
+
+def record_activities(added=(), removed=()):
+    """Apply added and removed activities to every derived collection"""
+    added, removed = list(added), list(removed)
+    leaderboard.record_activities(added=added, removed=removed)
+    team_leaderboard.record_activities(added=added, removed=removed)
+    rollups.record_activities(added=added, removed=removed)
+    leaderboard_periods.record_activities(added=added, removed=removed)
+
+
+def rebuild():
+    """Recompute every derived collection from the activities collection"""
+    leaderboard.rebuild()
+    team_leaderboard.rebuild()
+    rollups.rebuild()
+    # Built from the rollups, so it must follow them
+    leaderboard_periods.rebuild()
+
+
+def recompute_users(user_ids):
+    """Recompute the derived rows of users whose activities were loaded in bulk"""
+    user_ids = sorted(set(user_ids))
+    if len(user_ids) > RECOMPUTE_LIMIT:
+        rebuild()
+        return
+    leaderboard.recompute(user_ids)
+    team_leaderboard.recompute(team_leaderboard.teams_of(user_ids).values())
+    rollups.rebuild(user_ids=user_ids)
+    leaderboard_periods.rebuild(user_ids=user_ids)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class OctofitTrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'octofit_tracker'
+
+    def ready(self):
+        from . import monitoring, pool, signals, slowops  # noqa: F401
+        monitoring.install()
+        pool.install()
+        slowops.install()
@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+os.environ.setdefault('OCTOFIT_ASYNC_READS', '1')
 
-application = get_asgi_application()
+# What get_asgi_application does, with a handler that streams exports off
+# the event loop (see handlers.py)
+django.setup(set_prefix=False)
+
+# Imported once Django is set up; serves the leaderboard event stream and
+# warms the Mongo pool on lifespan startup
+from octofit_tracker import live, pool  # noqa: E402
+from octofit_tracker.handlers import ASGIHandler  # noqa: E402
+
+django_application = ASGIHandler()
+
+application = pool.lifespan(live.route(django_application))
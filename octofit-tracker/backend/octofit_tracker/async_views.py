@@ -0,0 +1,149 @@
+"""Async list and retrieve for the JSON API, read through motor.
+
+Under ASGI the router's list and detail routes are wrapped so plain JSON
+GETs run on the event loop instead of holding a thread on a blocking
+pymongo call. The response is the one the sync fast path renders,
+validators included. Anything else (writes, the browsable API, query
+parameters the async path does not understand) is handed to the regular
+DRF view in a worker thread.
+"""
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.http import HttpResponse
+from django.urls import URLPattern
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import AllowAny
+
+from . import versions
+from .mongo import get_async_database
+from .views import get_validators, is_not_modified, set_validators
+
+ASYNC_ACTIONS = ('list', 'retrieve')
+QUERY_PARAMS = {'fields', 'exclude', 'format'}
+
+
+def wrap_patterns(patterns):
+    """Swap the list and detail routes of fast-read viewsets for async views"""
+    wrapped = []
+    for pattern in patterns:
+        callback = pattern.callback
+        actions = getattr(callback, 'actions', None) or {}
+        serializer_class = getattr(getattr(callback, 'cls', None), 'serializer_class', None)
+        if actions.get('get') in ASYNC_ACTIONS and hasattr(serializer_class, 'aget_fast_context'):
+            pattern = URLPattern(pattern.pattern, async_view(callback), pattern.default_args, pattern.name)
+        wrapped.append(pattern)
+    return wrapped
+
+
+def async_view(callback):
+    sync_view = sync_to_async(callback)
+
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET':
+            response = await read(callback, request, args, kwargs)
+            if response is not None:
+                return response
+        return await sync_view(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    view.cls = callback.cls
+    view.initkwargs = callback.initkwargs
+    view.actions = callback.actions
+    return view
+
+
+def prepare(callback, request, args, kwargs):
+    """
+    Set up the viewset as DRF would for this request.
+
+    Returns None when the request needs something only the sync view
+    does: another renderer, authentication, throttling or an unknown
+    query parameter.
+    """
+    view = callback.cls(**callback.initkwargs)
+    view.action_map = callback.actions
+    for method, action in callback.actions.items():
+        setattr(view, method, getattr(view, action))
+    view.args, view.kwargs = args, kwargs
+    view.format_kwarg = view.get_format_suffix(**kwargs)
+    request = view.initialize_request(request, *args, **kwargs)
+    view.request = request
+    if view.get_throttles() or not all(isinstance(permission, AllowAny) for permission in view.get_permissions()):
+        return None
+    try:
+        request.accepted_renderer, request.accepted_media_type = view.perform_content_negotiation(request)
+        if not view.use_fast_read(request):
+            return None
+        view.get_requested_fields()
+    except APIException:
+        return None
+
+    allowed = set(QUERY_PARAMS)
+    if view.action == 'list' and view.paginator is not None:
+        allowed |= {view.paginator.cursor_query_param, view.paginator.page_size_query_param}
+    if not set(request.query_params) <= allowed:
+        return None
+    return view
+
+
+async def read(callback, request, args, kwargs):
+    view = prepare(callback, request, args, kwargs)
+    if view is None:
+        return None
+    request = view.request
+    database = get_async_database()
+    collection_versions, last_modified = await versions.acurrent(view.get_version_collections(), database)
+    etag, last_modified = get_validators(request, collection_versions, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return set_validators(finalize(view, HttpResponse(status=304)), etag, last_modified)
+
+    model = view.queryset.model
+    collection = database[model._meta.db_table]
+    columns = {name: model._meta.get_field(name).column for name in view.get_projection()}
+    projection = {column: 1 for column in columns.values()}
+
+    def to_row(document):
+        return {name: document.get(column) for name, column in columns.items()}
+
+    if view.action == 'retrieve':
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        try:
+            object_id = ObjectId(kwargs[lookup_url_kwarg])
+        except (InvalidId, TypeError):
+            return None
+        document = await collection.find_one({'_id': object_id}, projection)
+        if document is None:
+            return None
+        data = await represent(view, [to_row(document)], database)
+        data = data[0]
+    elif view.paginator is not None:
+        async def fetch(query, sort, limit):
+            documents = await collection.find(query, projection).sort(sort).limit(limit).to_list(None)
+            return [to_row(document) for document in documents]
+
+        rows = await view.paginator.apaginate(fetch, request, model)
+        data = view.paginator.get_paginated_response(await represent(view, rows, database)).data
+    else:
+        documents = await collection.find({}, projection).to_list(None)
+        data = await represent(view, [to_row(document) for document in documents], database)
+
+    content = request.accepted_renderer.render(
+        data, request.accepted_media_type, {'request': request, 'view': view}
+    )
+    response = HttpResponse(content, content_type=request.accepted_media_type)
+    return set_validators(finalize(view, response), etag, last_modified)
+
+
+async def represent(view, rows, database):
+    serializer_class = view.get_serializer_class()
+    fields = view.get_requested_fields()
+    context = await serializer_class.aget_fast_context(rows, fields, database)
+    return serializer_class.to_fast_representation(rows, fields, context)
+
+
+def finalize(view, response):
+    """Add the headers APIView.finalize_response would"""
+    for key, value in view.default_response_headers.items():
+        response[key] = value
+    return response
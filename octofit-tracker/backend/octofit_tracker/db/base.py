@@ -0,0 +1,30 @@
+"""djongo engine that draws its MongoClient from ``octofit_tracker.pool``."""
+import os
+
+from djongo import base
+
+from .. import pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pid = None
+
+    def get_new_connection(self, connection_params):
+        self.pid = os.getpid()
+        self.client_connection = pool.get_client(self.settings_dict)
+        database = self.client_connection[connection_params['name']]
+        self.djongo_connection = base.DjongoClient(database, connection_params['enforce_schema'])
+        return database
+
+    def ensure_connection(self):
+        # A connection inherited across a fork belongs to the parent's client
+        if self.connection is not None and self.pid != os.getpid():
+            self.connection = None
+        super().ensure_connection()
+
+    def _close(self):
+        # The pooled client outlives Django's per-request connection handling
+        pass
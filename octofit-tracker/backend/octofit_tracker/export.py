@@ -0,0 +1,70 @@
+"""Constant-memory CSV and NDJSON export of activities.
+
+Rows come off a Mongo cursor in ``batch_size`` batches, are rendered
+with the activity serializer's fast path and written straight to the
+response, so memory use does not grow with the size of the export.
+"""
+import csv
+import io
+import zlib
+from itertools import islice
+
+import orjson
+
+from .models import Activity
+from .mongo import get_collection
+from .serializers import ActivitySerializer
+
+BATCH_SIZE = 1000
+
+
+def iter_batches(query, batch_size=BATCH_SIZE):
+    """Yield lists of rendered activities matching a Mongo filter, oldest first"""
+    sources = ActivitySerializer.get_fast_sources()
+    cursor = get_collection(Activity).find(
+        query, {source: 1 for source in sources}
+    ).sort([('date', 1), ('_id', 1)]).batch_size(batch_size)
+    try:
+        while True:
+            documents = list(islice(cursor, batch_size))
+            if not documents:
+                return
+            rows = [{source: document.get(source) for source in sources} for document in documents]
+            yield ActivitySerializer.to_fast_representation(rows)
+    finally:
+        cursor.close()
+
+
+def as_csv(batches):
+    fields = [name for name, source, convert in ActivitySerializer.get_fast_fields()]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def as_ndjson(batches):
+    for batch in batches:
+        yield b''.join(orjson.dumps(item) + b'\n' for item in batch)
+
+
+def gzipped(chunks):
+    """Compress a byte stream into a gzip file as it is produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+FORMATS = {
+    'csv': as_csv,
+    'ndjson': as_ndjson,
+}
@@ -0,0 +1,120 @@
+"""Chunked validation and bulk insertion of activity rows."""
+import json
+from itertools import islice
+
+from pymongo.errors import BulkWriteError
+
+from . import aggregates, versions
+from .models import Activity
+from .mongo import get_collection, to_document
+from .serializers import ActivitySerializer
+
+CHUNK_SIZE = 500
+DUPLICATE_KEY = 11000
+
+
+class IngestResult:
+    """Running tally of an ingestion: created ids, per-row errors and the users whose rows are stored"""
+
+    def __init__(self):
+        self.created = []
+        self.errors = []
+        self.duplicates = 0
+        self.user_ids = set()
+
+    def add_error(self, index, errors):
+        self.errors.append({'index': index, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': len(self.created),
+            'failed': len(self.errors),
+            'ids': [str(object_id) for object_id in self.created],
+            'errors': sorted(self.errors, key=lambda error: error['index']),
+        }
+
+
+def parse_ndjson(lines):
+    """Yield decoded rows from an iterable of NDJSON lines, skipping blanks"""
+    index = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError as exc:
+            yield index, exc
+        index += 1
+
+
+def ingest_activities(rows, chunk_size=CHUNK_SIZE, update_aggregates=True):
+    """
+    Validate and insert ``(index, data)`` rows in chunks.
+
+    Rows that fail validation or insertion are reported by index without
+    affecting the rest of the batch. Leaderboard and rollup deltas for
+    everything that was inserted are applied once at the end.
+    """
+    result = IngestResult()
+    inserted = []
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        inserted.extend(insert_chunk(chunk, result))
+    if inserted:
+        versions.bump(Activity)
+    if update_aggregates:
+        aggregates.record_activities(added=inserted)
+    return result
+
+
+def insert_chunk(chunk, result, ids=None):
+    """
+    Validate one chunk, insert the valid rows and return their documents.
+
+    ``ids`` optionally maps row indexes to fixed ``_id`` values; rows whose
+    id already exists are counted in ``result.duplicates`` instead of
+    failing, so replaying a chunk is harmless.
+    """
+    indexes, documents = [], []
+    for index, data in chunk:
+        if isinstance(data, Exception):
+            result.add_error(index, {'non_field_errors': [f'Invalid JSON: {data}']})
+            continue
+        if not isinstance(data, dict):
+            result.add_error(index, {'non_field_errors': ['Expected an object.']})
+            continue
+        serializer = ActivitySerializer(data=data)
+        if not serializer.is_valid():
+            result.add_error(index, serializer.errors)
+            continue
+        document = to_document(Activity(**serializer.validated_data))
+        if ids is not None:
+            document['_id'] = ids[index]
+        indexes.append(index)
+        documents.append(document)
+    if not documents:
+        return []
+
+    failed, duplicate = set(), set()
+    try:
+        get_collection(Activity).insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        for error in exc.details.get('writeErrors', []):
+            failed.add(error['index'])
+            if ids is not None and error.get('code') == DUPLICATE_KEY:
+                result.duplicates += 1
+                duplicate.add(error['index'])
+                continue
+            result.add_error(indexes[error['index']], {'non_field_errors': [error.get('errmsg', 'Write failed.')]})
+    inserted = [document for position, document in enumerate(documents) if position not in failed]
+    result.created.extend(document['_id'] for document in inserted)
+    # A duplicate was stored by an earlier attempt, which may have stopped
+    # before updating that user's derived rows
+    result.user_ids.update(
+        document['user_id'] for position, document in enumerate(documents)
+        if position not in failed or position in duplicate
+    )
+    return inserted
@@ -0,0 +1,220 @@
+"""Incremental maintenance of the leaderboard collection.
+
+Activity writes are folded into per-user deltas which are applied with
+atomic ``$inc`` updates. Ranks use competition ranking on
+``total_calories`` (rank = 1 + number of entries with a strictly higher
+score), so a score change only shifts the entries it jumps over.
+"""
+from collections import defaultdict
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+from . import versions
+from .models import Activity, Leaderboard, User
+from .mongo import get_collection, to_object_id_expression
+
+ACTIVITY_FIELDS = ['user_id', 'activity_type', 'duration', 'calories', 'distance', 'date']
+SCORE_FIELD = 'total_calories'
+REBUILD_CHUNK_SIZE = 1000
+
+
+def snapshot(activity):
+    """Copy the fields that feed the leaderboard out of an activity"""
+    return {field: getattr(activity, field) for field in ACTIVITY_FIELDS}
+
+
+def _value(activity, field):
+    if isinstance(activity, dict):
+        return activity.get(field)
+    return getattr(activity, field)
+
+
+def activity_deltas(added=(), removed=()):
+    """Fold added and removed activities into per-user total deltas"""
+    deltas = defaultdict(lambda: {'total_calories': 0, 'total_activities': 0, 'total_distance': 0.0})
+    for activities, sign in ((added, 1), (removed, -1)):
+        for activity in activities:
+            delta = deltas[_value(activity, 'user_id')]
+            delta['total_calories'] += sign * (_value(activity, 'calories') or 0)
+            delta['total_activities'] += sign
+            delta['total_distance'] += sign * (_value(activity, 'distance') or 0)
+    return dict(deltas)
+
+
+def record_activities(added=(), removed=()):
+    """Apply the leaderboard changes caused by activity writes"""
+    apply_deltas(activity_deltas(added=added, removed=removed))
+
+
+def apply_deltas(deltas):
+    """Apply per-user total deltas and move the affected ranks"""
+    collection = get_collection(Leaderboard)
+    changed = False
+    for user_id, delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        changed = True
+        entry = collection.find_one_and_update(
+            {'user_id': user_id},
+            {'$inc': delta, '$setOnInsert': {'rank': 0}},
+            projection={SCORE_FIELD: 1, 'rank': 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        if entry is None:
+            _insert_entry(collection, user_id, delta[SCORE_FIELD])
+            continue
+        old_score = entry[SCORE_FIELD]
+        new_score = old_score + delta[SCORE_FIELD]
+        if new_score != old_score:
+            shift = move_entry(collection, entry['_id'], old_score, new_score)
+            if shift:
+                collection.update_one({'_id': entry['_id']}, {'$inc': {'rank': shift}})
+    if changed:
+        versions.bump(Leaderboard)
+
+
+def move_entry(collection, entry_id, old_score, new_score, scope=None):
+    """Shift the ranks of the entries a score change jumps over.
+
+    Returns how much the moving entry's own rank changes. ``scope``
+    restricts the ranking to a subset of the collection's documents.
+    """
+    others = dict(scope or {}, _id={'$ne': entry_id})
+    if new_score > old_score:
+        # Entries strictly between the scores fall one place behind us,
+        # entries we were tied with are now strictly below us, and we
+        # share the rank of entries already at the new score.
+        passed = collection.update_many(
+            dict(others, **{SCORE_FIELD: {'$gt': old_score, '$lt': new_score}}),
+            {'$inc': {'rank': 1}},
+        ).modified_count
+        collection.update_many(dict(others, **{SCORE_FIELD: old_score}), {'$inc': {'rank': 1}})
+        return -(passed + collection.count_documents(dict(others, **{SCORE_FIELD: new_score})))
+    # Entries strictly between the scores move ahead of us, entries now
+    # tied with us gain a place, and entries we were tied with pass us.
+    passed = collection.update_many(
+        dict(others, **{SCORE_FIELD: {'$gt': new_score, '$lt': old_score}}),
+        {'$inc': {'rank': -1}},
+    ).modified_count
+    collection.update_many(dict(others, **{SCORE_FIELD: new_score}), {'$inc': {'rank': -1}})
+    return passed + collection.count_documents(dict(others, **{SCORE_FIELD: old_score}))
+
+
+def recompute(user_ids):
+    """
+    Bring the entries of ``user_ids`` back in line with their activities.
+
+    Totals are re-aggregated for those users only and the differences are
+    applied as deltas, so the rest of the board just has its ranks moved.
+    """
+    user_ids = list(user_ids)
+    collection = get_collection(Leaderboard)
+    totals_fields = ('total_calories', 'total_activities', 'total_distance')
+    for start in range(0, len(user_ids), REBUILD_CHUNK_SIZE):
+        chunk = user_ids[start:start + REBUILD_CHUNK_SIZE]
+        totals = {row['_id']: row for row in get_collection(Activity).aggregate([
+            {'$match': {'user_id': {'$in': chunk}}},
+            {'$group': {
+                '_id': '$user_id',
+                'total_calories': {'$sum': '$calories'},
+                'total_activities': {'$sum': 1},
+                'total_distance': {'$sum': {'$ifNull': ['$distance', 0]}},
+            }},
+        ])}
+        current = {
+            entry['user_id']: entry
+            for entry in collection.find({'user_id': {'$in': chunk}}, dict.fromkeys(totals_fields + ('user_id',), 1))
+        }
+        apply_deltas({
+            user_id: {
+                field: totals.get(user_id, {}).get(field, 0) - current.get(user_id, {}).get(field, 0)
+                for field in totals_fields
+            }
+            for user_id in chunk
+        })
+
+
+def rebuild():
+    """
+    Recompute every entry from the activities collection.
+
+    Used when data is loaded in bulk: one aggregation produces the totals
+    already joined to user names and sorted by score, and ranks
+    are assigned while streaming the result into the collection.
+    """
+    pipeline = [
+        {'$group': {
+            '_id': '$user_id',
+            'total_calories': {'$sum': '$calories'},
+            'total_activities': {'$sum': 1},
+            'total_distance': {'$sum': {'$ifNull': ['$distance', 0]}},
+        }},
+        {'$sort': {SCORE_FIELD: -1}},
+        {'$lookup': {
+            'from': User._meta.db_table,
+            'let': {'user_id': '$_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$_id', to_object_id_expression('$$user_id')]}}},
+                {'$project': {'first_name': 1, 'last_name': 1, 'team_id': 1, 'team_name': 1}},
+            ],
+            'as': 'user',
+        }},
+        {'$addFields': {'user': {'$arrayElemAt': ['$user', 0]}}},
+    ]
+    collection = get_collection(Leaderboard)
+    collection.delete_many({})
+
+    entries, rank, previous_score = [], 0, None
+    rows = get_collection(Activity).aggregate(pipeline, allowDiskUse=True)
+    for position, row in enumerate(rows, start=1):
+        if row[SCORE_FIELD] != previous_score:
+            rank, previous_score = position, row[SCORE_FIELD]
+        user = row.get('user') or {}
+        entries.append({
+            'user_id': row['_id'],
+            'user_name': f"{user.get('first_name', '')} {user.get('last_name', '')}".strip(),
+            'team_id': user.get('team_id') or '',
+            'team_name': user.get('team_name') or '',
+            'total_calories': row['total_calories'],
+            'total_activities': row['total_activities'],
+            'total_distance': round(row['total_distance'], 2),
+            'rank': rank,
+        })
+        if len(entries) >= REBUILD_CHUNK_SIZE:
+            collection.insert_many(entries, ordered=False)
+            entries = []
+    if entries:
+        collection.insert_many(entries, ordered=False)
+    versions.bump(Leaderboard)
+
+
+def _insert_entry(collection, user_id, score):
+    """Fill in a freshly upserted entry's profile and rank"""
+    collection.update_many(
+        {SCORE_FIELD: {'$lt': score}, 'user_id': {'$ne': user_id}},
+        {'$inc': {'rank': 1}},
+    )
+    rank = 1 + collection.count_documents({SCORE_FIELD: {'$gt': score}})
+    collection.update_one({'user_id': user_id}, {'$set': dict(_profile(user_id), rank=rank)})
+
+
+def _profile(user_id):
+    """Look up the denormalized user and team names for an entry"""
+    profile = {'user_name': '', 'team_id': '', 'team_name': ''}
+    user = _find_by_id(User, user_id, {'first_name': 1, 'last_name': 1, 'team_id': 1, 'team_name': 1})
+    if user is None:
+        return profile
+    profile['user_name'] = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
+    profile['team_id'] = user.get('team_id') or ''
+    profile['team_name'] = user.get('team_name') or ''
+    return profile
+
+
+def _find_by_id(model, object_id, projection):
+    try:
+        return get_collection(model).find_one({'_id': ObjectId(object_id)}, projection)
+    except (InvalidId, TypeError):
+        return None
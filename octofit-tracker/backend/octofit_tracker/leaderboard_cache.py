@@ -0,0 +1,52 @@
+"""Cache of the rendered top of the leaderboard, overall and per team.
+
+Entries are keyed on the leaderboard version counter, so any write to the
+leaderboard makes every cached slice unreachable at once; the cache TTL
+bounds how long the orphaned entries stay around. The configured
+``leaderboard`` cache is process memory by default and can point at
+memcached or Redis instead.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .models import Leaderboard
+from .serializers import LeaderboardSerializer
+
+CACHE_ALIAS = 'leaderboard'
+
+
+def top(version, n, team_id=None):
+    """Return the top ``n`` entries, overall or for one team"""
+    cache = caches[CACHE_ALIAS]
+    key = f"leaderboard:top:{version}:{team_id or '*'}"
+    data = cache.get(key)
+    if data is None:
+        metrics.increment('leaderboard_cache.misses')
+        started = time.perf_counter()
+        data = _build(team_id)
+        metrics.observe('leaderboard_cache.rebuild', time.perf_counter() - started)
+        cache.set(key, data)
+    else:
+        metrics.increment('leaderboard_cache.hits')
+    return data[:n]
+
+
+def _build(team_id):
+    """Render the largest slice any request may ask for"""
+    queryset = Leaderboard.objects.order_by('rank', '_id')
+    if team_id:
+        queryset = queryset.filter(team_id=team_id)
+    rows = queryset.values(*LeaderboardSerializer.get_fast_sources())[:settings.OCTOFIT_LEADERBOARD_TOP_N]
+    return LeaderboardSerializer.to_fast_representation(list(rows))
+
+
+def hit_rate():
+    hits = metrics.counter('leaderboard_cache.hits')
+    total = hits + metrics.counter('leaderboard_cache.misses')
+    return hits / total if total else None
+
+
+metrics.register_gauge('leaderboard_cache.hit_rate', hit_rate)
@@ -0,0 +1,212 @@
+"""Leaderboards over this week, this month and the last 7 or 30 days.
+
+Each ``leaderboard_periods`` document holds one user's totals for one
+UTC day, ISO week or calendar month. Activity writes are folded into
+``$inc`` upserts on all three buckets. The calendar windows read their
+current week or month bucket in score order, and the rolling windows sum
+each user's day buckets. Neither ever touches ``activities``.
+
+Buckets only exist while a window can still read them: writes to older
+buckets are skipped, and ``expire`` (run by the
+``expire_leaderboard_periods`` command on a schedule) deletes buckets
+that have aged out.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import DeleteOne, UpdateOne
+
+from . import versions
+from .models import ActivityRollup, Leaderboard, LeaderboardPeriod
+from .mongo import get_collection
+from .rollups import day_of
+
+PERIODS = ('day', 'week', 'month')
+# window: (bucket period, number of day buckets summed or None for the current bucket)
+WINDOWS = {
+    'week': ('week', None),
+    'month': ('month', None),
+    '7d': ('day', 7),
+    '30d': ('day', 30),
+}
+LONGEST_ROLLING_WINDOW = max(days for period, days in WINDOWS.values() if days)
+TOTALS = ('total_calories', 'total_activities', 'total_distance')
+SCORE_FIELD = 'total_calories'
+REBUILD_CHUNK_SIZE = 1000
+# The same buckets as period_start, computed from a rollup's day
+BUCKET_STARTS = {
+    'day': '$day',
+    'week': {'$dateFromParts': {'isoWeekYear': {'$isoWeekYear': '$day'}, 'isoWeek': {'$isoWeek': '$day'}}},
+    'month': {'$dateFromParts': {'year': {'$year': '$day'}, 'month': {'$month': '$day'}}},
+}
+
+
+def period_start(period, day):
+    """Midnight UTC starting the bucket of ``period`` that holds ``day``"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def retention_start(period, now=None):
+    """The oldest bucket of ``period`` any window still reads"""
+    today = day_of(now or datetime.utcnow())
+    if period == 'day':
+        return today - timedelta(days=LONGEST_ROLLING_WINDOW - 1)
+    return period_start(period, today)
+
+
+def window_range(window, now=None):
+    """The bucket period and ``[start, end)`` day range a window covers"""
+    period, days = WINDOWS[window]
+    today = day_of(now or datetime.utcnow())
+    if period == 'week':
+        start = period_start(period, today)
+        return period, start, start + timedelta(days=7)
+    if period == 'month':
+        start = period_start(period, today)
+        return period, start, (start + timedelta(days=32)).replace(day=1)
+    return period, today - timedelta(days=days - 1), today + timedelta(days=1)
+
+
+def _value(activity, field):
+    if isinstance(activity, dict):
+        return activity.get(field)
+    return getattr(activity, field)
+
+
+def period_deltas(added=(), removed=()):
+    """Fold added and removed activities into per-(user, period, bucket) deltas"""
+    deltas = defaultdict(lambda: {'total_calories': 0, 'total_activities': 0, 'total_distance': 0.0})
+    for activities, sign in ((added, 1), (removed, -1)):
+        for activity in activities:
+            day = day_of(_value(activity, 'date'))
+            for period in PERIODS:
+                delta = deltas[(_value(activity, 'user_id'), period, period_start(period, day))]
+                delta['total_calories'] += sign * (_value(activity, 'calories') or 0)
+                delta['total_activities'] += sign
+                delta['total_distance'] += sign * (_value(activity, 'distance') or 0)
+    return dict(deltas)
+
+
+def record_activities(added=(), removed=()):
+    """Apply the bucket changes caused by activity writes"""
+    apply_deltas(period_deltas(added=added, removed=removed))
+
+
+def apply_deltas(deltas, now=None):
+    """Upsert the deltas of retained buckets and drop buckets left empty"""
+    oldest = {period: retention_start(period, now) for period in PERIODS}
+    operations = []
+    for (user_id, period, start), delta in deltas.items():
+        if not any(delta.values()) or start < oldest[period]:
+            continue
+        key = {'user_id': user_id, 'period': period, 'start': start}
+        operations.append(UpdateOne(key, {'$inc': delta}, upsert=True))
+        if delta['total_activities'] < 0:
+            operations.append(DeleteOne(dict(key, total_activities={'$lte': 0})))
+    if operations:
+        get_collection(LeaderboardPeriod).bulk_write(operations)
+        versions.bump(LeaderboardPeriod)
+
+
+def standings(window, n, now=None):
+    """The top ``n`` users of a window with competition ranks on ``total_calories``"""
+    period, start, end = window_range(window, now)
+    collection = get_collection(LeaderboardPeriod)
+    if period != 'day':
+        rows = collection.find(
+            {'period': period, 'start': start}, dict.fromkeys(('user_id',) + TOTALS, 1)
+        ).sort(SCORE_FIELD, -1).limit(n)
+    else:
+        rows = collection.aggregate([
+            {'$match': {'period': period, 'start': {'$gte': start, '$lt': end}}},
+            {'$group': dict(_id='$user_id', **{field: {'$sum': f'${field}'} for field in TOTALS})},
+            {'$sort': {SCORE_FIELD: -1}},
+            {'$limit': n},
+            {'$project': dict({'_id': 0, 'user_id': '$_id'}, **dict.fromkeys(TOTALS, 1))},
+        ], allowDiskUse=True)
+    rows = list(rows)
+
+    profiles = {
+        entry['user_id']: entry
+        for entry in get_collection(Leaderboard).find(
+            {'user_id': {'$in': [row['user_id'] for row in rows]}},
+            {'user_id': 1, 'user_name': 1, 'team_id': 1, 'team_name': 1},
+        )
+    }
+    results, rank, previous_score = [], 0, None
+    for position, row in enumerate(rows, start=1):
+        if row[SCORE_FIELD] != previous_score:
+            rank, previous_score = position, row[SCORE_FIELD]
+        profile = profiles.get(row['user_id'], {})
+        results.append({
+            'rank': rank,
+            'user_id': row['user_id'],
+            'user_name': profile.get('user_name', ''),
+            'team_id': profile.get('team_id', ''),
+            'team_name': profile.get('team_name', ''),
+            'total_calories': row['total_calories'],
+            'total_activities': row['total_activities'],
+            'total_distance': round(row['total_distance'], 2),
+        })
+    last_day = end - timedelta(days=1)
+    return {'window': window, 'start': start.date().isoformat(), 'end': last_day.date().isoformat(), 'results': results}
+
+
+def expire(now=None):
+    """Delete the buckets no window reads any more; returns how many per period"""
+    collection = get_collection(LeaderboardPeriod)
+    deleted = {
+        period: collection.delete_many({'period': period, 'start': {'$lt': retention_start(period, now)}}).deleted_count
+        for period in PERIODS
+    }
+    if any(deleted.values()):
+        versions.bump(LeaderboardPeriod)
+    return deleted
+
+
+def rebuild(user_ids=None, now=None):
+    """
+    Recompute the retained buckets from the daily rollups.
+
+    With ``user_ids`` only those users' buckets are replaced, a chunk of
+    users at a time; otherwise the whole collection is rebuilt.
+    """
+    collection = get_collection(LeaderboardPeriod)
+    if user_ids is None:
+        collection.delete_many({})
+        matches = [{}]
+    else:
+        user_ids = list(user_ids)
+        matches = [
+            {'user_id': {'$in': user_ids[start:start + REBUILD_CHUNK_SIZE]}}
+            for start in range(0, len(user_ids), REBUILD_CHUNK_SIZE)
+        ]
+    for match in matches:
+        if match:
+            collection.delete_many(match)
+        documents = []
+        for period in PERIODS:
+            rows = get_collection(ActivityRollup).aggregate([
+                {'$match': dict(match, day={'$gte': retention_start(period, now)})},
+                {'$group': {
+                    '_id': {'user_id': '$user_id', 'start': BUCKET_STARTS[period]},
+                    'total_calories': {'$sum': '$total_calories'},
+                    'total_activities': {'$sum': '$activity_count'},
+                    'total_distance': {'$sum': '$total_distance'},
+                }},
+                {'$replaceRoot': {'newRoot': {'$mergeObjects': [
+                    '$_id', {'period': period}, {field: f'${field}' for field in TOTALS},
+                ]}}},
+            ], allowDiskUse=True)
+            for row in rows:
+                documents.append(row)
+                if len(documents) >= REBUILD_CHUNK_SIZE:
+                    collection.insert_many(documents, ordered=False)
+                    documents = []
+        if documents:
+            collection.insert_many(documents, ordered=False)
+    versions.bump(LeaderboardPeriod)
@@ -0,0 +1,182 @@
+"""Server-Sent Events stream of leaderboard rank changes.
+
+``GET /api/leaderboard/stream/?team_id=`` is answered by a raw ASGI
+handler mounted in front of Django (see ``asgi.py``). Each worker process
+runs one broadcaster per event loop that checks the leaderboard version
+counter once per ``OCTOFIT_LIVE_WINDOW`` seconds and, when it moved,
+reloads the top of every subscribed slice. A burst of writes inside one
+window therefore costs one reload and one frame per client. Every client
+is diffed against the entries it was last sent, so a slow client simply
+gets a larger delta instead of a backlog of frames.
+
+Frames:
+
+* ``snapshot``: the full top of the slice, sent on connect
+* ``delta``: ``{"version", "changed": [entries], "removed": [user_ids]}``
+"""
+import asyncio
+from urllib.parse import parse_qs
+from weakref import WeakKeyDictionary
+
+import orjson
+from corsheaders.conf import conf as cors_conf
+from django.conf import settings
+
+from . import versions
+from .models import Leaderboard
+from .mongo import get_async_database
+from .serializers import LeaderboardSerializer
+
+STREAM_PATH = '/api/leaderboard/stream/'
+HEARTBEAT_SECONDS = 15
+
+_broadcasters = WeakKeyDictionary()
+
+
+def route(application):
+    """Serve the stream path here and pass every other request to ``application``"""
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+            await stream(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+    return router
+
+
+def diff(sent, entries):
+    """The entries that changed since ``sent`` and the user ids that left"""
+    current = {entry['user_id']: entry for entry in entries}
+    changed = [entry for user_id, entry in current.items() if sent.get(user_id) != entry]
+    removed = [user_id for user_id in sent if user_id not in current]
+    return changed, removed
+
+
+class Channel:
+    """Latest top entries for one slice, plus a wake-up for its subscribers"""
+
+    def __init__(self):
+        self.version = None
+        self.entries = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+
+    def publish(self, version, entries):
+        self.version, self.entries = version, entries
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class Broadcaster:
+    def __init__(self):
+        self.channels = {}
+        self.version = None
+        self.task = None
+
+    async def subscribe(self, team_id):
+        channel = self.channels.setdefault(team_id, Channel())
+        channel.subscribers += 1
+        if channel.entries is None:
+            database = get_async_database()
+            (version,), _ = await versions.acurrent([Leaderboard], database)
+            channel.publish(version, await top_entries(database, team_id))
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return channel
+
+    def unsubscribe(self, team_id):
+        channel = self.channels[team_id]
+        channel.subscribers -= 1
+        if not channel.subscribers:
+            del self.channels[team_id]
+
+    async def run(self):
+        database = get_async_database()
+        while self.channels:
+            await asyncio.sleep(settings.OCTOFIT_LIVE_WINDOW)
+            (version,), _ = await versions.acurrent([Leaderboard], database)
+            if version == self.version:
+                continue
+            self.version = version
+            for team_id, channel in list(self.channels.items()):
+                if channel.version != version:
+                    channel.publish(version, await top_entries(database, team_id))
+
+
+def get_broadcaster():
+    loop = asyncio.get_running_loop()
+    if loop not in _broadcasters:
+        _broadcasters[loop] = Broadcaster()
+    return _broadcasters[loop]
+
+
+async def top_entries(database, team_id=None):
+    """The rendered top of the leaderboard, read through motor"""
+    query = {'team_id': team_id} if team_id else {}
+    sources = LeaderboardSerializer.get_fast_sources()
+    documents = await database[Leaderboard._meta.db_table].find(
+        query, {source: 1 for source in sources}
+    ).sort([('rank', 1), ('_id', 1)]).limit(settings.OCTOFIT_LEADERBOARD_TOP_N).to_list(None)
+    rows = [{source: document.get(source) for source in sources} for document in documents]
+    return LeaderboardSerializer.to_fast_representation(rows, context={})
+
+
+def frame(event, data):
+    return b'event: ' + event.encode() + b'\ndata: ' + orjson.dumps(data) + b'\n\n'
+
+
+def response_headers(scope):
+    headers = [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]
+    origin = dict(scope['headers']).get(b'origin')
+    if origin and cors_conf.CORS_ALLOW_ALL_ORIGINS:
+        headers.append((b'access-control-allow-origin', b'*'))
+    elif origin and origin.decode('latin-1') in cors_conf.CORS_ALLOWED_ORIGINS:
+        headers.append((b'access-control-allow-origin', origin))
+        headers.append((b'vary', b'Origin'))
+    return headers
+
+
+async def stream(scope, receive, send):
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405, 'headers': [(b'allow', b'GET')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    team_id = parse_qs(scope['query_string'].decode('latin-1')).get('team_id', [None])[0]
+    broadcaster = get_broadcaster()
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        # subscribe counts the subscriber before fetching the first snapshot,
+        # so a failed fetch must be unsubscribed too
+        channel = await broadcaster.subscribe(team_id)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers(scope)})
+        await send({'type': 'http.response.body', 'body': frame('snapshot', channel.entries), 'more_body': True})
+        sent = {entry['user_id']: entry for entry in channel.entries}
+        seen = channel.version
+        while not disconnected.done():
+            if channel.version == seen:
+                woken = asyncio.ensure_future(channel.changed.wait())
+                await asyncio.wait(
+                    {woken, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                woken.cancel()
+                if disconnected.done():
+                    break
+            seen = channel.version
+            changed, removed = diff(sent, channel.entries)
+            if changed or removed:
+                body = frame('delta', {'version': channel.version, 'changed': changed, 'removed': removed})
+                sent = {entry['user_id']: entry for entry in channel.entries}
+            else:
+                body = b': ping\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        broadcaster.unsubscribe(team_id)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
@@ -0,0 +1,87 @@
+from bson import SON
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from octofit_tracker.monitoring import record_commands
+from octofit_tracker.mongo import get_database
+from octofit_tracker.urls import router
+
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+IGNORED_COLLECTIONS = {'__schema__', 'django_migrations'}
+
+
+class Command(BaseCommand):
+    help = 'Explain the queries behind each API list endpoint and flag collection scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', default=[],
+            help='Extra API path to audit, e.g. "/api/activities/?user_id=abc" (repeatable)'
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Exit with an error if any collection scan is found'
+        )
+
+    def handle(self, *args, **options):
+        paths = [
+            reverse(f'{basename}-list')
+            for prefix, viewset, basename in router.registry
+            if getattr(viewset, 'queryset', None) is not None
+        ] + options['path']
+
+        client = Client(HTTP_HOST='localhost')
+        database = get_database()
+        scans = 0
+        for path in paths:
+            with record_commands(keep_commands=True) as recorder:
+                response = client.get(path, HTTP_ACCEPT='application/json')
+            self.stdout.write(f'{path} -> {response.status_code}')
+            for record in recorder.commands:
+                collection = record['command'].get(record['name'])
+                if record['name'] not in EXPLAINABLE_COMMANDS or collection in IGNORED_COLLECTIONS:
+                    continue
+                stages = plan_stages(explain(database, record['command']))
+                summary = f"  {record['name']} {collection}: {' > '.join(stages)}"
+                if 'COLLSCAN' in stages:
+                    scans += 1
+                    self.stdout.write(self.style.ERROR(f'{summary}  [COLLECTION SCAN]'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(summary))
+
+        if scans:
+            message = f'{scans} queries scan a whole collection'
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every audited query is served by an index'))
+
+
+def explain(database, command):
+    """Re-run a captured command under explain without its session fields"""
+    command = SON(
+        (key, value) for key, value in command.items()
+        if not key.startswith('$') and key != 'lsid'
+    )
+    return database.command('explain', command, verbosity='queryPlanner')
+
+
+def plan_stages(explanation):
+    """Flatten every winning-plan stage name found in an explain result"""
+    stages = []
+
+    def walk(node, in_plan=False):
+        if isinstance(node, dict):
+            if in_plan and 'stage' in node:
+                stages.append(node['stage'])
+            for key, value in node.items():
+                if key == 'rejectedPlans':
+                    continue
+                walk(value, in_plan or key in ('winningPlan', 'queryPlan'))
+        elif isinstance(node, list):
+            for item in node:
+                walk(item, in_plan)
+
+    walk(explanation)
+    return stages
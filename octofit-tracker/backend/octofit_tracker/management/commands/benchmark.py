@@ -0,0 +1,200 @@
+import json
+import math
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from octofit_tracker.monitoring import record_commands
+from octofit_tracker.synthetic import synthetic_id
+
+DEFAULT_SIZES = '1000,100000,1000000'
+ACTIVITIES_PER_USER = 20
+ACTIVITY_TYPES = ['Running', 'Cycling', 'Swimming', 'Yoga']
+ORDERINGS = ['-date', 'date', '-calories', 'calories']
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed the database at several sizes and measure API latency, throughput, '
+        'Mongo operations per request and peak RSS. Existing data is replaced.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default=DEFAULT_SIZES,
+            help=f'Comma-separated activity counts to seed (default: {DEFAULT_SIZES})'
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario (default: 200)')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario (default: 10)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for data and request sampling')
+        parser.add_argument('--workers', type=int, default=4, help='populate_db worker processes')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument(
+            '--noinput', '--no-input', action='store_false', dest='interactive',
+            help='Do not prompt before replacing the database contents'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers')
+        if options['interactive']:
+            answer = input('This replaces every collection in the configured database. Continue? [y/N] ')
+            if answer.lower() not in ('y', 'yes'):
+                raise CommandError('Benchmark cancelled.')
+
+        report = {'meta': self.meta(options), 'results': []}
+        for size in sizes:
+            report['results'].append(self.run_size(size, options))
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'requests_per_scenario': options['requests'],
+            'warmup_requests': options['warmup'],
+            'seed': options['seed'],
+        }
+
+    def run_size(self, size, options):
+        users = max(size // ACTIVITIES_PER_USER, 1)
+        self.stderr.write(f'Seeding {size} activities for {users} users...')
+        started = time.perf_counter()
+        call_command(
+            'populate_db', users=users, teams=max(users // 100, 2),
+            activities_per_user=ACTIVITIES_PER_USER, seed=options['seed'],
+            workers=options['workers'], stdout=StringIO()
+        )
+        result = {
+            'activities': users * ACTIVITIES_PER_USER,
+            'users': users,
+            'seed_seconds': round(time.perf_counter() - started, 3),
+            'scenarios': [],
+        }
+
+        client = Client(HTTP_HOST='localhost', HTTP_ACCEPT='application/json')
+        rng = random.Random(options['seed'])
+        for name, method, make_request in scenarios(users, users * ACTIVITIES_PER_USER, rng):
+            self.stderr.write(f'  {name}')
+            result['scenarios'].append(
+                measure(client, name, method, make_request, options['requests'], options['warmup'])
+            )
+        return result
+
+
+def scenarios(users, activities, rng):
+    """(name, method, request factory) for every benchmarked call"""
+    def user_id():
+        return str(synthetic_id('user', rng.randrange(users)))
+
+    def activity_id():
+        return str(synthetic_id('activity', rng.randrange(activities)))
+
+    def filtered_activities():
+        return (
+            f'/api/activities/?user_id={user_id()}&activity_type={rng.choice(ACTIVITY_TYPES)}'
+            f'&ordering={rng.choice(ORDERINGS)}'
+        )
+
+    def new_activity():
+        return {
+            'user_id': user_id(),
+            'activity_type': rng.choice(ACTIVITY_TYPES),
+            'duration': rng.randint(15, 90),
+            'calories': rng.randint(100, 900),
+            'distance': round(rng.uniform(0, 20), 2),
+            'date': datetime.now(timezone.utc).isoformat(),
+        }
+
+    return [
+        ('list users', 'get', lambda: ('/api/users/', None)),
+        ('list teams', 'get', lambda: ('/api/teams/', None)),
+        ('list activities', 'get', lambda: ('/api/activities/', None)),
+        ('list leaderboard', 'get', lambda: ('/api/leaderboard/', None)),
+        ('list workouts', 'get', lambda: ('/api/workouts/', None)),
+        ('filter activities', 'get', lambda: (filtered_activities(), None)),
+        ('retrieve user', 'get', lambda: (f'/api/users/{user_id()}/', None)),
+        ('retrieve activity', 'get', lambda: (f'/api/activities/{activity_id()}/', None)),
+        ('create activity', 'post', lambda: ('/api/activities/', new_activity())),
+        ('filter user stats', 'get', lambda: (f'/api/stats/users/?user_id={user_id()}', None)),
+    ]
+
+
+def measure(client, name, method, make_request, count, warmup):
+    send = getattr(client, method)
+
+    def call():
+        path, body = make_request()
+        if body is None:
+            return send(path)
+        return send(path, data=json.dumps(body), content_type='application/json')
+
+    for _ in range(warmup):
+        call()
+
+    latencies = []
+    statuses = {}
+    with record_commands() as recorder:
+        started = time.perf_counter()
+        for _ in range(count):
+            request_started = time.perf_counter()
+            response = call()
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'name': name,
+        'requests': count,
+        'statuses': {str(code): hits for code, hits in sorted(statuses.items())},
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': round(sum(latencies) / count, 3) if count else None,
+        'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+        'mongo_ops_per_request': round(recorder.count / count, 2) if count else None,
+        'mongo_ms_per_request': round(recorder.duration / count, 3) if count else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return round(ordered[rank], 3)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker import leaderboard_periods
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete the leaderboard period buckets no window reads any more; '
+        'schedule it daily, e.g. from cron shortly after midnight UTC'
+    )
+
+    def handle(self, *args, **options):
+        deleted = leaderboard_periods.expire()
+        for period, count in deleted.items():
+            self.stdout.write(f'{period}: {count} buckets deleted')
+        self.stdout.write(self.style.SUCCESS(f'Expired {sum(deleted.values())} leaderboard period buckets'))
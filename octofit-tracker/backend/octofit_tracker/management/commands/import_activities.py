@@ -0,0 +1,209 @@
+import csv
+import hashlib
+import json
+import os
+import time
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker import aggregates, versions
+from octofit_tracker.ingest import IngestResult, insert_chunk
+from octofit_tracker.models import Activity
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream activities from a CSV or NDJSON file into the database in chunks. '
+        'Progress is checkpointed so an interrupted import resumes where it stopped; '
+        'the leaderboard and daily rollups of the imported users are recomputed at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or NDJSON file of activities')
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())), help='Default: from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per insert_many call (default: 5000)')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: PATH.checkpoint)')
+        parser.add_argument(
+            '--source',
+            help='Stable name for this import, used to derive row ids (default: file name and size)'
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--errors', help='Append rejected rows to this NDJSON file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'{path} does not exist')
+        fmt = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError('Cannot tell the file format from its extension; pass --format')
+        source = options['source'] or f'{os.path.basename(path)}:{os.path.getsize(path)}'
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        state = self.load_checkpoint(checkpoint_path, source, options['restart'])
+        if state['offset']:
+            self.stdout.write(f"Resuming at byte {state['offset']} after {state['rows']} rows")
+
+        errors_file = open(options['errors'], 'a') if options['errors'] else None
+        users = set(state['users'])
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as handle:
+                rows = read_rows(handle, fmt, state)
+                for chunk, offset in chunks(rows, max(options['chunk_size'], 1)):
+                    result = IngestResult()
+                    ids = {index: row_id(source, index) for index, data in chunk}
+                    inserted = insert_chunk(chunk, result, ids=ids)
+                    self.track_users(state, users, result.user_ids)
+                    self.report_errors(result, errors_file, state['failed'])
+
+                    state['rows'] += len(chunk)
+                    state['created'] += len(inserted)
+                    state['duplicates'] += result.duplicates
+                    state['failed'] += len(result.errors)
+                    state['offset'] = offset
+                    save_checkpoint(checkpoint_path, state)
+                    elapsed = max(time.perf_counter() - started, 1e-9)
+                    self.stdout.write(f"{state['rows']} rows read, {state['created']} created ({state['rows'] / elapsed:,.0f} rows/s)")
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        versions.bump(Activity)
+        if state['rebuild']:
+            self.stdout.write('Rebuilding the leaderboards and rollups...')
+            aggregates.rebuild()
+        else:
+            self.stdout.write(f'Recomputing leaderboards and rollups for {len(users)} users...')
+            aggregates.recompute_users(users)
+        # No checkpoint is written when the file has no rows
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['created']} activities "
+            f"({state['duplicates']} already present, {state['failed']} rejected)"
+        ))
+
+    def load_checkpoint(self, checkpoint_path, source, restart):
+        state = {
+            'source': source, 'offset': 0, 'header': None, 'rows': 0,
+            'created': 0, 'duplicates': 0, 'failed': 0, 'users': [], 'rebuild': False,
+        }
+        if restart or not os.path.exists(checkpoint_path):
+            return state
+        with open(checkpoint_path) as handle:
+            saved = json.load(handle)
+        if saved.get('source') != source:
+            raise CommandError(
+                f'{checkpoint_path} belongs to a different import ({saved.get("source")}); '
+                'pass --restart or --checkpoint'
+            )
+        state.update(saved)
+        return state
+
+    def track_users(self, state, users, user_ids):
+        """
+        Add a chunk's users to those to recompute at the end.
+
+        Past ``RECOMPUTE_LIMIT`` users the end is a full rebuild anyway, so
+        only that is remembered; otherwise the checkpoint's list is
+        rewritten when the chunk brought in new users.
+        """
+        if state['rebuild']:
+            return
+        count = len(users)
+        users.update(user_ids)
+        if len(users) > aggregates.RECOMPUTE_LIMIT:
+            users.clear()
+            state.update(rebuild=True, users=[])
+        elif len(users) != count:
+            state['users'] = sorted(users)
+
+    def report_errors(self, result, errors_file, already_reported):
+        for position, error in enumerate(sorted(result.errors, key=lambda error: error['index'])):
+            if errors_file:
+                errors_file.write(json.dumps({'offset': error['index'], 'errors': error['errors']}) + '\n')
+            elif already_reported + position < MAX_REPORTED_ERRORS:
+                self.stderr.write(f"Row at byte {error['index']}: {json.dumps(error['errors'])}")
+
+
+def row_id(source, offset):
+    """A stable id for the row starting at ``offset``, so replays are detected"""
+    return ObjectId(hashlib.sha1(f'{source}:{offset}'.encode()).digest()[:12])
+
+
+def save_checkpoint(checkpoint_path, state):
+    """Write the checkpoint atomically so a crash never leaves half a file"""
+    temporary = f'{checkpoint_path}.tmp'
+    with open(temporary, 'w') as handle:
+        json.dump(state, handle)
+    os.replace(temporary, checkpoint_path)
+
+
+def read_rows(handle, fmt, state):
+    """
+    Yield ``(offset, data, end)`` for each row from the checkpointed offset.
+
+    ``offset`` is where the row starts and ``end`` where the next one
+    does, so a checkpoint at ``end`` never splits a row.
+    """
+    if fmt == 'csv':
+        yield from _read_csv(handle, state)
+    else:
+        yield from _read_ndjson(handle, state['offset'])
+
+
+def _lines(handle, offset):
+    handle.seek(offset)
+    for line in iter(handle.readline, b''):
+        offset += len(line)
+        yield offset, line
+
+
+def _read_ndjson(handle, offset):
+    start = offset
+    for end, line in _lines(handle, offset):
+        if line.strip():
+            try:
+                yield start, json.loads(line), end
+            except ValueError as exc:
+                yield start, exc, end
+        start = end
+
+
+def _read_csv(handle, state):
+    position = {'offset': 0}
+
+    def text_lines(offset):
+        position['offset'] = offset
+        for end, line in _lines(handle, offset):
+            position['offset'] = end
+            yield line.decode('utf-8-sig' if end == len(line) else 'utf-8')
+
+    if state['header'] is None:
+        state['header'] = next(csv.reader(text_lines(0)), None)
+        if state['header'] is None:
+            return
+        state['offset'] = position['offset']
+    start = state['offset']
+    for record in csv.reader(text_lines(start)):
+        end = position['offset']
+        if any(record):
+            # Empty cells are absent values, and columns such as an exported
+            # _id are ignored by the serializer
+            yield start, {name: value for name, value in zip(state['header'], record) if value != ''}, end
+        start = end
+
+
+def chunks(rows, size):
+    """Group rows into ``[(offset, data), ...]`` chunks with the offset to resume from"""
+    chunk, end = [], None
+    for offset, data, end in rows:
+        chunk.append((offset, data))
+        if len(chunk) >= size:
+            yield chunk, end
+            chunk = []
+    if chunk:
+        yield chunk, end
@@ -1,24 +1,141 @@
-from django.core.management.base import BaseCommand
-from octofit_tracker.models import User, Team, Activity, Leaderboard, Workout
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from octofit_tracker import leaderboard, leaderboard_periods, rollups, synthetic, team_leaderboard, versions
+from octofit_tracker.models import (
+    User, Team, Activity, ActivityRollup, Leaderboard, LeaderboardPeriod, TeamLeaderboard, Workout,
+)
+from octofit_tracker.mongo import get_collection
 from datetime import datetime, timedelta
+from multiprocessing import Pool
+import os
 import random
+import time
 
 
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int,
+            help='Generate this many synthetic users instead of the hero data set'
+        )
+        parser.add_argument('--teams', type=int, default=10, help='Synthetic teams (default: 10)')
+        parser.add_argument(
+            '--activities-per-user', type=int, default=20,
+            help='Synthetic activities per user (default: 20)'
+        )
+        parser.add_argument(
+            '--days', type=int, default=90,
+            help='Days of history the synthetic activities span (default: 90)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Seed for synthetic data (default: 42)')
+        parser.add_argument(
+            '--end-date',
+            help='Last day covered by synthetic activities, YYYY-MM-DD (default: today)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Documents per insert_many call (default: 5000)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=min(os.cpu_count() or 1, 8),
+            help='Worker processes writing chunks; 1 writes in-process'
+        )
+
+    def handle(self, *args, **options):
+        self.clear()
+        if options['users']:
+            self.populate_synthetic(options)
+        else:
+            self.populate_heroes()
+        self.create_workouts()
+        versions.bump(User, Team, Activity, ActivityRollup, Leaderboard, LeaderboardPeriod, TeamLeaderboard, Workout)
+        self.summary()
+
+    def clear(self):
         self.stdout.write('Clearing existing data...')
-        
-        # Delete existing data
-        User.objects.all().delete()
-        Team.objects.all().delete()
-        Activity.objects.all().delete()
-        Leaderboard.objects.all().delete()
-        Workout.objects.all().delete()
-        
+        for model in (User, Team, Activity, ActivityRollup, Leaderboard, LeaderboardPeriod, TeamLeaderboard, Workout):
+            get_collection(model).delete_many({})
         self.stdout.write(self.style.SUCCESS('Existing data cleared'))
-        
+
+    def populate_synthetic(self, options):
+        if options['users'] < 1 or options['teams'] < 1:
+            raise CommandError('--users and --teams must be positive')
+        end_date = parse_date(options['end_date']) if options['end_date'] else datetime.utcnow().date()
+        if end_date is None:
+            raise CommandError('--end-date must be formatted YYYY-MM-DD')
+
+        database = settings.DATABASES['default']
+        generator_options = {
+            'client': dict(database.get('CLIENT', {})),
+            'database': database['NAME'],
+            'teams': options['teams'],
+            'activities_per_user': options['activities_per_user'],
+            'days': max(options['days'], 1),
+            'seed': options['seed'],
+            'end': datetime.combine(end_date, datetime.min.time()) + timedelta(days=1),
+        }
+
+        teams = synthetic.generate_teams(generator_options)
+        get_collection(Team).insert_many(teams)
+        self.stdout.write(self.style.SUCCESS(f'Created {len(teams)} synthetic teams'))
+
+        users = options['users']
+        chunk_size = max(options['chunk_size'], 1)
+        users_per_activity_chunk = max(chunk_size // max(options['activities_per_user'], 1), 1)
+        self.write_chunks('users', users, chunk_size, generator_options, options['workers'])
+        if options['activities_per_user'] > 0:
+            self.write_chunks('activities', users, users_per_activity_chunk, generator_options, options['workers'])
+
+        self.build_leaderboard()
+        self.build_rollups()
+
+    def write_chunks(self, collection, users, step, generator_options, workers):
+        self.stdout.write(f'Writing synthetic {collection}...')
+        tasks = [
+            (collection, start, min(start + step, users), generator_options)
+            for start in range(0, users, step)
+        ]
+        started = time.perf_counter()
+        written = 0
+        if workers > 1:
+            with Pool(workers) as pool:
+                for count in pool.imap_unordered(synthetic.write_chunk, tasks):
+                    written += count
+        else:
+            for task in tasks:
+                written += synthetic.write_chunk(task)
+        self.report_rate(f'Created {written} {collection}', written, started)
+
+    def build_leaderboard(self):
+        self.stdout.write('Building leaderboard...')
+        started = time.perf_counter()
+        leaderboard.rebuild()
+        count = get_collection(Leaderboard).estimated_document_count()
+        self.report_rate(f'Created leaderboard with {count} entries', count, started)
+        started = time.perf_counter()
+        team_leaderboard.rebuild()
+        count = get_collection(TeamLeaderboard).estimated_document_count()
+        self.report_rate(f'Created team leaderboard with {count} entries', count, started)
+
+    def build_rollups(self):
+        self.stdout.write('Building daily rollups...')
+        started = time.perf_counter()
+        rollups.rebuild()
+        count = get_collection(ActivityRollup).estimated_document_count()
+        self.report_rate(f'Created {count} daily rollups', count, started)
+        started = time.perf_counter()
+        leaderboard_periods.rebuild()
+        count = get_collection(LeaderboardPeriod).estimated_document_count()
+        self.report_rate(f'Created {count} leaderboard period buckets', count, started)
+
+    def report_rate(self, message, rows, started):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(f'{message} in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)'))
+
+    def populate_heroes(self):
         # Create Teams
         self.stdout.write('Creating teams...')
         team_marvel = Team.objects.create(
@@ -183,34 +300,10 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS(f'Created {Activity.objects.count()} activities'))
         
-        # Create Leaderboard entries
-        self.stdout.write('Creating leaderboard...')
-        for hero in all_heroes:
-            user_activities = Activity.objects.filter(user_id=str(hero._id))
-            total_calories = sum([act.calories for act in user_activities])
-            total_distance = sum([act.distance for act in user_activities if act.distance])
-            total_activities = user_activities.count()
-            
-            team = team_marvel if hero.team_id == str(team_marvel._id) else team_dc
-            
-            Leaderboard.objects.create(
-                user_id=str(hero._id),
-                user_name=f"{hero.first_name} {hero.last_name}",
-                team_id=str(team._id),
-                team_name=team.name,
-                total_calories=total_calories,
-                total_activities=total_activities,
-                total_distance=round(total_distance, 2)
-            )
-        
-        # Update ranks
-        leaderboard_entries = Leaderboard.objects.all().order_by('-total_calories')
-        for rank, entry in enumerate(leaderboard_entries, start=1):
-            entry.rank = rank
-            entry.save()
-        
-        self.stdout.write(self.style.SUCCESS(f'Created leaderboard with {Leaderboard.objects.count()} entries'))
-        
+        self.build_leaderboard()
+        self.build_rollups()
+
+    def create_workouts(self):
         # Create Workouts
         self.stdout.write('Creating workout suggestions...')
         workouts = [
@@ -318,11 +411,14 @@ class Command(BaseCommand):
             )
         
         self.stdout.write(self.style.SUCCESS(f'Created {Workout.objects.count()} workout suggestions'))
-        
-        # Summary
+
+    def summary(self):
         self.stdout.write(self.style.SUCCESS('\n=== Database Population Complete ==='))
-        self.stdout.write(self.style.SUCCESS(f'Teams: {Team.objects.count()}'))
-        self.stdout.write(self.style.SUCCESS(f'Users: {User.objects.count()}'))
-        self.stdout.write(self.style.SUCCESS(f'Activities: {Activity.objects.count()}'))
-        self.stdout.write(self.style.SUCCESS(f'Leaderboard Entries: {Leaderboard.objects.count()}'))
-        self.stdout.write(self.style.SUCCESS(f'Workouts: {Workout.objects.count()}'))
+        for label, model in (
+            ('Teams', Team), ('Users', User), ('Activities', Activity),
+            ('Daily Rollups', ActivityRollup), ('Leaderboard Entries', Leaderboard),
+            ('Team Leaderboard Entries', TeamLeaderboard), ('Leaderboard Period Buckets', LeaderboardPeriod),
+            ('Workouts', Workout),
+        ):
+            count = get_collection(model).estimated_document_count()
+            self.stdout.write(self.style.SUCCESS(f'{label}: {count}'))
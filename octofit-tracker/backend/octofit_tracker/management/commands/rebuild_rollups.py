@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from octofit_tracker import leaderboard_periods, rollups
+from octofit_tracker.models import ActivityRollup, LeaderboardPeriod
+from octofit_tracker.mongo import get_collection
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the daily per-user activity rollups from the activities collection, '
+        'then the leaderboard period buckets built from them'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rollups.rebuild()
+        # Built from the rollups, so it must follow them
+        leaderboard_periods.rebuild()
+        count = get_collection(ActivityRollup).estimated_document_count()
+        buckets = get_collection(LeaderboardPeriod).estimated_document_count()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rollups and {buckets} leaderboard period buckets in {elapsed:.1f}s'))
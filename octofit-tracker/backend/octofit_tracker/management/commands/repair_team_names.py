@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+from octofit_tracker import team_names
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the team names copied onto users and leaderboard entries from the teams collection'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        repaired = team_names.repair()
+        elapsed = time.perf_counter() - started
+        for model, count in repaired.items():
+            self.stdout.write(f'{model._meta.db_table}: {count} documents repaired')
+        self.stdout.write(self.style.SUCCESS(f'Repaired team names in {elapsed:.1f}s'))
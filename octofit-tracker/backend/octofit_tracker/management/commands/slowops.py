@@ -0,0 +1,74 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker.slowops import sql_shape
+
+ORDERINGS = {
+    'total': lambda group: group['total_ms'],
+    'count': lambda group: group['count'],
+    'mean': lambda group: group['total_ms'] / group['count'],
+    'max': lambda group: group['max_ms'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Aggregate the slow Mongo operation log by query shape, slowest first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Log file (default: OCTOFIT_SLOWOPS_LOG)')
+        parser.add_argument('--limit', type=int, default=20, help='Shapes to show (default: 20)')
+        parser.add_argument(
+            '--order', choices=sorted(ORDERINGS), default='total',
+            help='Rank shapes by total, mean or max duration, or by count (default: total)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.OCTOFIT_SLOWOPS_LOG
+        if not os.path.isfile(path):
+            raise CommandError(f'{path} does not exist; no operation has been logged yet')
+        with open(path) as handle:
+            groups = aggregate(handle)
+        if not groups:
+            self.stdout.write('No slow operations logged')
+            return
+
+        ranked = sorted(groups.values(), key=ORDERINGS[options['order']], reverse=True)
+        self.stdout.write(f"{'count':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'docs/op':>8}")
+        for group in ranked[:options['limit']]:
+            documents = '-' if group['documents'] is None else f"{group['documents'] / group['count']:.1f}"
+            self.stdout.write(
+                f"{group['count']:>7} {group['total_ms']:>10.1f} {group['total_ms'] / group['count']:>9.1f} "
+                f"{group['max_ms']:>9.1f} {documents:>8}  {group['command_name']} {group['collection']}"
+            )
+            if group['sql']:
+                self.stdout.write(f"        SQL:   {group['sql']}")
+            self.stdout.write(f"        Mongo: {json.dumps(group['shape'])}")
+        if len(ranked) > options['limit']:
+            self.stdout.write(f"... {len(ranked) - options['limit']} more shapes")
+
+
+def aggregate(lines):
+    """Group log records by normalized SQL and Mongo command shape"""
+    groups = {}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        sql = sql_shape(record.get('sql'))
+        key = (sql, json.dumps(record['shape'], sort_keys=True))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                'sql': sql, 'shape': record['shape'], 'command_name': record['command_name'],
+                'collection': record['collection'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'documents': None,
+            }
+        group['count'] += 1
+        group['total_ms'] += record['duration_ms']
+        group['max_ms'] = max(group['max_ms'], record['duration_ms'])
+        if record.get('documents') is not None:
+            group['documents'] = (group['documents'] or 0) + record['documents']
+    return groups
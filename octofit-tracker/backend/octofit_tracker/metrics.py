@@ -0,0 +1,50 @@
+"""In-process counters, timings and gauges exposed at /api/metrics/.
+
+Values are per worker process; aggregate across workers in whatever
+scrapes the endpoint.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+_gauges = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, seconds):
+    """Record one duration sample for a timing"""
+    with _lock:
+        timing = _timings.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        milliseconds = seconds * 1000
+        timing['count'] += 1
+        timing['total_ms'] += milliseconds
+        timing['max_ms'] = max(timing['max_ms'], milliseconds)
+
+
+def register_gauge(name, callback):
+    """Report ``callback()`` under ``name`` whenever metrics are read"""
+    _gauges[name] = callback
+
+
+def counter(name):
+    with _lock:
+        return _counters[name]
+
+
+def snapshot():
+    with _lock:
+        data = {
+            'counters': dict(_counters),
+            'timings': {
+                name: dict(timing, mean_ms=timing['total_ms'] / timing['count'] if timing['count'] else 0.0)
+                for name, timing in _timings.items()
+            },
+        }
+    data['gauges'] = {name: callback() for name, callback in _gauges.items()}
+    return data
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:29
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0003_leaderboard_team_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('user_id', models.CharField(max_length=100)),
+                ('day', models.DateTimeField()),
+                ('activity_type', models.CharField(max_length=100)),
+                ('total_duration', models.IntegerField(default=0)),
+                ('total_calories', models.IntegerField(default=0)),
+                ('total_distance', models.FloatField(default=0.0)),
+                ('activity_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'activity_rollups',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='activityrollup',
+            constraint=models.UniqueConstraint(fields=('user_id', 'day', 'activity_type'), name='rollup_user_day_type'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0004_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='activity',
+            name='activity_user_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='activity',
+            name='activity_type_date',
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user_id', 'date', '_id'], name='activity_user_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['activity_type', 'date', '_id'], name='activity_type_date_id'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user_id', 'calories', '_id'], name='activity_user_calories_id'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['calories', '_id'], name='activity_calories_id'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:48
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0006_user_team_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamLeaderboard',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('team_id', models.CharField(max_length=100, unique=True)),
+                ('team_name', models.CharField(max_length=200)),
+                ('member_count', models.IntegerField(default=0)),
+                ('total_calories', models.IntegerField(default=0)),
+                ('total_activities', models.IntegerField(default=0)),
+                ('total_distance', models.FloatField(default=0.0)),
+                ('rank', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'team_leaderboard',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='teamleaderboard',
+            index=models.Index(fields=['rank', '_id'], name='team_leaderboard_rank_id'),
+        ),
+        migrations.AddIndex(
+            model_name='teamleaderboard',
+            index=models.Index(fields=['total_calories'], name='team_leaderboard_calories'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:50
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0007_team_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardPeriod',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('user_id', models.CharField(max_length=100)),
+                ('period', models.CharField(max_length=10)),
+                ('start', models.DateTimeField()),
+                ('total_calories', models.IntegerField(default=0)),
+                ('total_activities', models.IntegerField(default=0)),
+                ('total_distance', models.FloatField(default=0.0)),
+            ],
+            options={
+                'db_table': 'leaderboard_periods',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardperiod',
+            index=models.Index(fields=['period', 'start', 'total_calories'], name='leaderboard_period_score'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardperiod',
+            constraint=models.UniqueConstraint(fields=('user_id', 'period', 'start'), name='leaderboard_period_user'),
+        ),
+    ]
@@ -9,10 +9,14 @@ class User(models.Model):
     last_name = models.CharField(max_length=200)
     password = models.CharField(max_length=200)
     team_id = models.CharField(max_length=100, null=True, blank=True)
+    team_name = models.CharField(max_length=200, null=True, blank=True)  # copied from teams, see team_names.py
     date_joined = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['team_id'], name='user_team'),
+        ]
 
     def __str__(self):
         return self.username
@@ -43,11 +47,43 @@ class Activity(models.Model):
 
     class Meta:
         db_table = 'activities'
+        # djongo creates every index ascending; MongoDB walks a compound
+        # index in either direction, so these also serve newest-first sorts.
+        # Ending on _id lets them serve the list endpoint's keyset order too;
+        # activity_filters.py only accepts filters these indexes can bound.
+        indexes = [
+            models.Index(fields=['user_id', 'date', '_id'], name='activity_user_date_id'),
+            models.Index(fields=['activity_type', 'date', '_id'], name='activity_type_date_id'),
+            models.Index(fields=['date', '_id'], name='activity_date_id'),
+            models.Index(fields=['user_id', 'calories', '_id'], name='activity_user_calories_id'),
+            models.Index(fields=['calories', '_id'], name='activity_calories_id'),
+        ]
 
     def __str__(self):
         return f"{self.activity_type} - {self.date}"
 
 
+class ActivityRollup(models.Model):
+    """One user's totals for one activity type on one UTC day"""
+    _id = models.ObjectIdField()
+    user_id = models.CharField(max_length=100)
+    day = models.DateTimeField()  # midnight UTC
+    activity_type = models.CharField(max_length=100)
+    total_duration = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    total_distance = models.FloatField(default=0.0)
+    activity_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'activity_rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'day', 'activity_type'], name='rollup_user_day_type'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.activity_type} - {self.day:%Y-%m-%d}"
+
+
 class Leaderboard(models.Model):
     _id = models.ObjectIdField()
     user_id = models.CharField(max_length=100)
@@ -61,11 +97,62 @@ class Leaderboard(models.Model):
 
     class Meta:
         db_table = 'leaderboard'
+        indexes = [
+            models.Index(fields=['rank', '_id'], name='leaderboard_rank_id'),
+            models.Index(fields=['user_id'], name='leaderboard_user'),
+            models.Index(fields=['total_calories'], name='leaderboard_calories'),
+            models.Index(fields=['team_id', 'rank'], name='leaderboard_team_rank'),
+        ]
 
     def __str__(self):
         return f"{self.user_name} - Rank {self.rank}"
 
 
+class TeamLeaderboard(models.Model):
+    """One team's summed member totals and rank, see team_leaderboard.py"""
+    _id = models.ObjectIdField()
+    team_id = models.CharField(max_length=100, unique=True)
+    team_name = models.CharField(max_length=200)
+    member_count = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    total_activities = models.IntegerField(default=0)
+    total_distance = models.FloatField(default=0.0)
+    rank = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'team_leaderboard'
+        indexes = [
+            models.Index(fields=['rank', '_id'], name='team_leaderboard_rank_id'),
+            models.Index(fields=['total_calories'], name='team_leaderboard_calories'),
+        ]
+
+    def __str__(self):
+        return f"{self.team_name} - Rank {self.rank}"
+
+
+class LeaderboardPeriod(models.Model):
+    """One user's leaderboard totals for one UTC day, ISO week or month, see leaderboard_periods.py"""
+    _id = models.ObjectIdField()
+    user_id = models.CharField(max_length=100)
+    period = models.CharField(max_length=10)  # day, week or month
+    start = models.DateTimeField()  # midnight UTC starting the bucket
+    total_calories = models.IntegerField(default=0)
+    total_activities = models.IntegerField(default=0)
+    total_distance = models.FloatField(default=0.0)
+
+    class Meta:
+        db_table = 'leaderboard_periods'
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'period', 'start'], name='leaderboard_period_user'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'start', 'total_calories'], name='leaderboard_period_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.period} {self.start:%Y-%m-%d}"
+
+
 class Workout(models.Model):
     _id = models.ObjectIdField()
     name = models.CharField(max_length=200)
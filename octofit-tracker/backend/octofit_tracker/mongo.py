@@ -0,0 +1,58 @@
+import asyncio
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from django.db import connections
+
+_async_clients = WeakKeyDictionary()
+
+
+def get_database(alias='default'):
+    """Return the pymongo database behind a djongo connection"""
+    connection = connections[alias]
+    connection.ensure_connection()
+    return connection.connection
+
+
+def get_collection(model_or_name, alias='default'):
+    """Return the raw pymongo collection for a model or collection name"""
+    if isinstance(model_or_name, str):
+        name = model_or_name
+    else:
+        name = model_or_name._meta.db_table
+    return get_database(alias)[name]
+
+
+def get_async_database(alias='default'):
+    """
+    Return a motor database for the running event loop.
+
+    Motor clients are bound to the loop they were created on, so one is
+    kept per loop and connection alias, built from the same
+    ``DATABASES`` entry djongo uses.
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    database = settings.DATABASES[alias]
+    if alias not in clients:
+        clients[alias] = AsyncIOMotorClient(io_loop=loop, **database.get('CLIENT', {}))
+    return clients[alias][database['NAME']]
+
+
+def to_document(instance, alias='default'):
+    """Build the document djongo would insert for an unsaved model instance"""
+    connection = connections[alias]
+    document = {}
+    for field in instance._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        value = field.pre_save(instance, add=True)
+        document[field.column] = field.get_db_prep_save(value, connection)
+    return document
+
+
+def to_object_id_expression(expression):
+    """Aggregation expression converting a string id to an ObjectId, or null"""
+    return {'$convert': {'input': expression, 'to': 'objectId', 'onError': None, 'onNull': None}}
@@ -0,0 +1,78 @@
+"""Hooks into pymongo command monitoring.
+
+A single listener is registered when the app loads. Code that wants to
+see the commands issued on its behalf opens a ``record_commands()``
+block; commands are attributed to every recorder active in the current
+context.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+_recorders = ContextVar('octofit_mongo_recorders', default=())
+
+
+class CommandRecorder:
+    """Collects the commands issued while it is active"""
+
+    def __init__(self, keep_commands=False):
+        self.keep_commands = keep_commands
+        self.commands = []
+        self.count = 0
+        self.duration = 0.0
+        self._pending = {}
+
+    def started(self, event):
+        self.count += 1
+        if self.keep_commands:
+            self._pending[event.request_id] = {
+                'name': event.command_name,
+                'database': event.database_name,
+                'command': event.command,
+            }
+
+    def finished(self, event, failed=False):
+        duration = event.duration_micros / 1000
+        self.duration += duration
+        record = self._pending.pop(event.request_id, None)
+        if record is not None:
+            record.update(duration_ms=duration, failed=failed)
+            self.commands.append(record)
+
+
+class _Listener(monitoring.CommandListener):
+
+    def started(self, event):
+        for recorder in _recorders.get():
+            recorder.started(event)
+
+    def succeeded(self, event):
+        for recorder in _recorders.get():
+            recorder.finished(event)
+
+    def failed(self, event):
+        for recorder in _recorders.get():
+            recorder.finished(event, failed=True)
+
+
+_listener = _Listener()
+_installed = False
+
+
+def install():
+    """Register the command listener; must run before any MongoClient exists"""
+    global _installed
+    if not _installed:
+        monitoring.register(_listener)
+        _installed = True
+
+
+@contextmanager
+def record_commands(keep_commands=False):
+    recorder = CommandRecorder(keep_commands=keep_commands)
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
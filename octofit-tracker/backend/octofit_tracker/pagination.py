@@ -0,0 +1,207 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from bson.errors import InvalidId
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from pymongo import ASCENDING, DESCENDING
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on a unique tuple of fields.
+
+    The cursor holds the ordering values of the last row on the page, so
+    every page is a range query on the ordering index and deep pages cost
+    the same as the first one.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-_id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [_flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position, reverse))
+
+        return self.finish_page(list(queryset[:self.page_size + 1]), position, reverse)
+
+    def paginate_collection(self, fetch, request, model):
+        """
+        ``paginate_queryset`` for raw Mongo reads.
+
+        ``fetch(filter, sort, limit)`` is called for the rows, which must
+        be dicts keyed by field name.
+        """
+        query, sort, position, reverse = self.get_mongo_page(request, model)
+        return self.finish_page(fetch(query, sort, self.page_size + 1), position, reverse)
+
+    async def apaginate(self, fetch, request, model):
+        """Async counterpart of ``paginate_collection``; ``fetch`` is awaited"""
+        query, sort, position, reverse = self.get_mongo_page(request, model)
+        rows = await fetch(query, sort, self.page_size + 1)
+        return self.finish_page(rows, position, reverse)
+
+    def get_mongo_page(self, request, model):
+        """The Mongo filter and sort selecting the requested page, plus its cursor position"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = model
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [_flip(field) for field in ordering]
+        sort = [
+            (self.get_column(field), DESCENDING if field.startswith('-') else ASCENDING)
+            for field in ordering
+        ]
+        query = self.get_mongo_filter(position, reverse) if position is not None else {}
+        return query, sort, position, reverse
+
+    def finish_page(self, rows, position, reverse):
+        """Trim the lookahead row and record the positions for the links"""
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        self.first_position = self.get_position(rows[0]) if rows else position
+        self.last_position = self.get_position(rows[-1]) if rows else position
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(self.last_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_position is None:
+            return None
+        return self.encode_cursor(self.first_position, reverse=True)
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return [row[field.lstrip('-')] for field in self.ordering]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def get_keyset_filter(self, position, reverse=False):
+        """Build the row-value comparison (a, b) > (x, y) as nested Q objects"""
+        keyset = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            keyset |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return keyset
+
+    def get_mongo_filter(self, position, reverse=False):
+        """The same comparison as ``get_keyset_filter`` as a Mongo filter"""
+        clauses = []
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            column = self.get_column(field)
+            descending = field.startswith('-') != reverse
+            clauses.append(dict(equal, **{column: {'$lt' if descending else '$gt': value}}))
+            equal[column] = value
+        return {'$or': clauses}
+
+    def get_column(self, field):
+        return self.model._meta.get_field(field.lstrip('-')).column
+
+    def encode_cursor(self, position, reverse):
+        payload = {'p': [_encode_value(value) for value in position]}
+        if reverse:
+            payload['r'] = 1
+        token = urlsafe_b64encode(json.dumps(payload).encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(token.encode('ascii')))
+            values = payload['p']
+            if len(values) != len(self.ordering):
+                raise ValueError(token)
+            position = [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, KeyError, DjangoValidationError, InvalidId):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
+
+
+class ActivityPagination(KeysetPagination):
+    ordering = ('-date', '-_id')
+
+
+class LeaderboardPagination(KeysetPagination):
+    ordering = ('rank', '_id')
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        # djongo hands back naive UTC datetimes
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
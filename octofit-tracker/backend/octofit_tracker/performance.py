@@ -0,0 +1,106 @@
+"""Per-request timing of Mongo, serializer and render work.
+
+``performance_middleware`` samples a share of requests
+(``OCTOFIT_PERF_SAMPLE_RATE``). For a sampled request it counts the Mongo
+commands issued and their time, adds up the sections wrapped with
+``timed``, and reports everything in a ``Server-Timing`` header and one
+JSON log line. Unsampled requests only pay for a context variable lookup
+in each timed call.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from .monitoring import record_commands
+
+logger = logging.getLogger('octofit_tracker.performance')
+
+_current = ContextVar('octofit_request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sections = defaultdict(float)
+
+    def add(self, name, seconds):
+        self.sections[name] += seconds * 1000
+
+
+def timed(name):
+    """Add the wrapped call's duration to section ``name`` of a sampled request"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings.add(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def sampled():
+    rate = settings.OCTOFIT_PERF_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+@sync_and_async_middleware
+def performance_middleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not sampled():
+                return await get_response(request)
+            timings = RequestTimings()
+            token = _current.set(timings)
+            try:
+                with record_commands() as recorder:
+                    response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return report(request, response, timings, recorder)
+    else:
+        def middleware(request):
+            if not sampled():
+                return get_response(request)
+            timings = RequestTimings()
+            token = _current.set(timings)
+            try:
+                with record_commands() as recorder:
+                    response = get_response(request)
+            finally:
+                _current.reset(token)
+            return report(request, response, timings, recorder)
+    return middleware
+
+
+def report(request, response, timings, recorder):
+    total = (time.perf_counter() - timings.started) * 1000
+    entry = {
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'total_ms': round(total, 3),
+        'mongo_ops': recorder.count,
+        'mongo_ms': round(recorder.duration, 3),
+    }
+    entry.update({f'{name}_ms': round(value, 3) for name, value in timings.sections.items()})
+
+    metrics = [f'mongo;dur={recorder.duration:.3f};desc="{recorder.count} ops"']
+    metrics += [f'{name};dur={value:.3f}' for name, value in timings.sections.items()]
+    metrics.append(f'total;dur={total:.3f}')
+    response['Server-Timing'] = ', '.join(metrics)
+    logger.info(json.dumps(entry))
+    return response
@@ -0,0 +1,183 @@
+"""Process-wide MongoClient, its warmup and connection pool metrics.
+
+djongo keeps one MongoClient per process but closes it whenever Django
+closes its connection, which with the default ``CONN_MAX_AGE`` is after
+every request, so each request opened fresh sockets. The
+``octofit_tracker.db`` engine takes its client from ``get_client``
+instead and leaves it open: the pool sized by the ``CLIENT`` options in
+``DATABASES`` lives as long as the worker.
+
+Clients are created with ``connect=False`` and forgotten in the child
+after a fork, so a client made in a preloading parent is never shared
+with workers. ``warmup`` opens connections and fills caches before a
+worker takes traffic; ``gunicorn.conf.py`` and ``lifespan`` call it.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from pymongo import MongoClient, monitoring
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_clients = {}
+_state = {'in_use': 0, 'peak_in_use': 0, 'open': 0, 'warm': False}
+
+
+def get_client(settings_dict=None):
+    """
+    The pooled MongoClient for a database's settings, created on first use.
+
+    Clients are keyed on the ``CLIENT`` options rather than the alias:
+    Django also connects under aliases that are not in ``DATABASES``,
+    such as the test runner's ``__no_db__``, with a copy of the settings.
+    """
+    if settings_dict is None:
+        settings_dict = settings.DATABASES['default']
+    options = settings_dict.get('CLIENT', {})
+    key = repr(sorted(options.items()))
+    with _lock:
+        if key not in _clients:
+            # djongo's results alignment expects ordered documents
+            _clients[key] = MongoClient(document_class=OrderedDict, connect=False, **options)
+        return _clients[key]
+
+
+def _forget_clients():
+    """After fork: the parent's clients and sockets must not be used here"""
+    global _lock
+    _lock = threading.Lock()
+    _clients.clear()
+    _state.update(in_use=0, peak_in_use=0, open=0, warm=False)
+
+
+os.register_at_fork(after_in_child=_forget_clients)
+
+
+def warmup(alias='default'):
+    """
+    Open ``minPoolSize`` connections (at least one) and fill the caches
+    the first requests would otherwise pay for. Runs once per process.
+    """
+    if _state['warm']:
+        return
+    from . import leaderboard_cache, serializers, versions
+    from .models import Leaderboard
+
+    started = time.perf_counter()
+    connections[alias].ensure_connection()
+    settings_dict = connections[alias].settings_dict
+    client = get_client(settings_dict)
+    count = max(settings_dict.get('CLIENT', {}).get('minPoolSize', 0), 1)
+    # Concurrent pings each check out their own connection
+    with ThreadPoolExecutor(count) as executor:
+        list(executor.map(lambda _: client.admin.command('ping'), range(count)))
+
+    for serializer_class in (
+        serializers.UserSerializer, serializers.TeamSerializer, serializers.ActivitySerializer,
+        serializers.LeaderboardSerializer, serializers.WorkoutSerializer,
+    ):
+        serializer_class.get_fast_fields()
+    (version,), _ = versions.current([Leaderboard])
+    leaderboard_cache.top(version, settings.OCTOFIT_LEADERBOARD_TOP_N)
+
+    _state['warm'] = True
+    metrics.observe('mongo_pool.warmup', time.perf_counter() - started)
+    logger.info('Warmed up %s with %d connections in %.0f ms', alias, count, (time.perf_counter() - started) * 1000)
+
+
+def safe_warmup(alias='default'):
+    """``warmup`` that logs failures instead of stopping the worker"""
+    try:
+        warmup(alias)
+    except Exception:
+        logger.exception('Warmup of %s failed; connections will open on demand', alias)
+
+
+def lifespan(application):
+    """Answer ASGI lifespan events, warming up on startup, and pass other scopes on"""
+    async def app(scope, receive, send):
+        if scope['type'] != 'lifespan':
+            await application(scope, receive, send)
+            return
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await sync_to_async(safe_warmup)()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    return app
+
+
+class _PoolListener(monitoring.ConnectionPoolListener):
+    """Times checkouts and counts connections in use across this process's clients"""
+
+    def __init__(self):
+        self._waiting = {}
+
+    def connection_check_out_started(self, event):
+        self._waiting[(event.address, threading.get_ident())] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = self._waiting.pop((event.address, threading.get_ident()), None)
+        if started is not None:
+            metrics.observe('mongo_pool.checkout_wait', time.perf_counter() - started)
+        with _lock:
+            _state['in_use'] += 1
+            _state['peak_in_use'] = max(_state['peak_in_use'], _state['in_use'])
+
+    def connection_check_out_failed(self, event):
+        self._waiting.pop((event.address, threading.get_ident()), None)
+        metrics.increment(f'mongo_pool.checkout_failed.{event.reason}')
+
+    def connection_checked_in(self, event):
+        with _lock:
+            _state['in_use'] -= 1
+
+    def connection_created(self, event):
+        with _lock:
+            _state['open'] += 1
+
+    def connection_closed(self, event):
+        with _lock:
+            _state['open'] -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        metrics.increment('mongo_pool.cleared')
+
+    def pool_closed(self, event):
+        pass
+
+
+_installed = False
+
+
+def install():
+    """Register the pool listener and gauges; must run before any MongoClient exists"""
+    global _installed
+    if not _installed:
+        monitoring.register(_PoolListener())
+        metrics.register_gauge('mongo_pool.in_use', lambda: _state['in_use'])
+        metrics.register_gauge('mongo_pool.peak_in_use', lambda: _state['peak_in_use'])
+        metrics.register_gauge('mongo_pool.open_connections', lambda: _state['open'])
+        metrics.register_gauge(
+            'mongo_pool.max_size', lambda: settings.DATABASES['default'].get('CLIENT', {}).get('maxPoolSize', 100)
+        )
+        _installed = True
@@ -0,0 +1,155 @@
+"""Daily per-user, per-activity-type totals.
+
+Each ``activity_rollups`` document holds one user's totals for one
+activity type on one UTC day. Activity writes are folded into ``$inc``
+upserts, so a year of history for a user is at most a few hundred small
+documents however many activities it took.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from pymongo import DeleteOne, UpdateOne
+
+from . import versions
+from .models import Activity, ActivityRollup
+from .mongo import get_collection
+
+REBUILD_CHUNK_SIZE = 1000
+TOTALS = ('total_duration', 'total_calories', 'total_distance', 'activity_count')
+PERIOD_FORMATS = {
+    'week': '%G-W%V',
+    'month': '%Y-%m',
+}
+
+
+def day_of(moment):
+    """Midnight UTC of the day an activity falls on, as a naive datetime"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def _value(activity, field):
+    if isinstance(activity, dict):
+        return activity.get(field)
+    return getattr(activity, field)
+
+
+def rollup_deltas(added=(), removed=()):
+    """Fold added and removed activities into per-(user, day, type) deltas"""
+    deltas = defaultdict(lambda: dict.fromkeys(TOTALS, 0))
+    for activities, sign in ((added, 1), (removed, -1)):
+        for activity in activities:
+            key = (_value(activity, 'user_id'), day_of(_value(activity, 'date')), _value(activity, 'activity_type'))
+            delta = deltas[key]
+            delta['total_duration'] += sign * (_value(activity, 'duration') or 0)
+            delta['total_calories'] += sign * (_value(activity, 'calories') or 0)
+            delta['total_distance'] += sign * (_value(activity, 'distance') or 0)
+            delta['activity_count'] += sign
+    return dict(deltas)
+
+
+def record_activities(added=(), removed=()):
+    """Apply the rollup changes caused by activity writes"""
+    apply_deltas(rollup_deltas(added=added, removed=removed))
+
+
+def apply_deltas(deltas):
+    """Upsert the deltas and drop rollups whose last activity was removed"""
+    operations = []
+    for (user_id, day, activity_type), delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        key = {'user_id': user_id, 'day': day, 'activity_type': activity_type}
+        operations.append(UpdateOne(key, {'$inc': delta}, upsert=True))
+        if delta['activity_count'] < 0:
+            operations.append(DeleteOne(dict(key, activity_count={'$lte': 0})))
+    if operations:
+        get_collection(ActivityRollup).bulk_write(operations)
+        versions.bump(ActivityRollup)
+
+
+def rebuild(user_ids=None):
+    """
+    Recompute rollups from the activities collection.
+
+    With ``user_ids`` only those users' rollups are replaced, a chunk of
+    users at a time; otherwise the whole collection is rebuilt.
+    """
+    if user_ids is None:
+        # $out keeps the target collection's indexes and swaps it in atomically
+        list(get_collection(Activity).aggregate(_pipeline() + [
+            {'$out': ActivityRollup._meta.db_table},
+        ], allowDiskUse=True))
+    else:
+        user_ids = list(user_ids)
+        collection = get_collection(ActivityRollup)
+        for start in range(0, len(user_ids), REBUILD_CHUNK_SIZE):
+            chunk = user_ids[start:start + REBUILD_CHUNK_SIZE]
+            documents = list(get_collection(Activity).aggregate(
+                [{'$match': {'user_id': {'$in': chunk}}}] + _pipeline(), allowDiskUse=True
+            ))
+            collection.delete_many({'user_id': {'$in': chunk}})
+            if documents:
+                collection.insert_many(documents, ordered=False)
+    versions.bump(ActivityRollup)
+
+
+def _pipeline():
+    """Group activities into rollup documents"""
+    return [
+        {'$group': {
+            '_id': {
+                'user_id': '$user_id',
+                'day': {'$dateFromString': {
+                    'dateString': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$date'}},
+                }},
+                'activity_type': '$activity_type',
+            },
+            'total_duration': {'$sum': '$duration'},
+            'total_calories': {'$sum': '$calories'},
+            'total_distance': {'$sum': {'$ifNull': ['$distance', 0]}},
+            'activity_count': {'$sum': 1},
+        }},
+        {'$replaceRoot': {'newRoot': {'$mergeObjects': ['$_id', {
+            name: f'${name}' for name in TOTALS
+        }]}}},
+    ]
+
+
+def daily(user_id, start=None, end=None, activity_type=None, period=None):
+    """
+    One user's rollups in a date range, oldest first.
+
+    Without ``period`` every stored day is returned; with ``week`` or
+    ``month`` the days are summed per bucket and activity type.
+    """
+    match = {'user_id': user_id}
+    if start or end:
+        match['day'] = {}
+        if start:
+            match['day']['$gte'] = day_of(start)
+        if end:
+            match['day']['$lt'] = end
+    if activity_type:
+        match['activity_type'] = activity_type
+
+    bucket = {'$dateToString': {'format': PERIOD_FORMATS.get(period, '%Y-%m-%d'), 'date': '$day'}}
+    pipeline = [{'$match': match}]
+    if period in PERIOD_FORMATS:
+        pipeline += [
+            {'$group': dict(
+                _id={'period': bucket, 'activity_type': '$activity_type'},
+                **{name: {'$sum': f'${name}'} for name in TOTALS}
+            )},
+            {'$replaceRoot': {'newRoot': {'$mergeObjects': ['$_id', {
+                name: f'${name}' for name in TOTALS
+            }]}}},
+            {'$sort': {'period': 1, 'activity_type': 1}},
+        ]
+    else:
+        pipeline += [
+            {'$sort': {'day': 1, 'activity_type': 1}},
+            {'$project': dict({'_id': 0, 'day': bucket, 'activity_type': 1}, **dict.fromkeys(TOTALS, 1))},
+        ]
+    return list(get_collection(ActivityRollup).aggregate(pipeline))
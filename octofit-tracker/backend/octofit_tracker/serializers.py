@@ -1,26 +1,138 @@
 from rest_framework import serializers
-from .models import User, Team, Activity, Leaderboard, Workout
+from rest_framework.exceptions import ValidationError
+from .models import User, Team, Activity, Leaderboard, TeamLeaderboard, Workout
+from .performance import timed
+
+
+class SparseFieldsMixin:
+    """
+    Lets callers keep only some of the declared fields.
+
+    ``fields=[...]`` drops every other readable field from the serializer.
+    ``get_sources`` gives the model fields those names read from, so the
+    query can project just those; a ``SerializerMethodField`` lists the
+    model fields it reads in ``field_dependencies``.
+    """
+    field_dependencies = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            keep = set(fields)
+            for name in list(self.fields):
+                if name not in keep and not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+    @classmethod
+    def select_fields(cls, fields=None, exclude=None):
+        """Validate ``fields``/``exclude`` names; None means every field"""
+        if fields is None and exclude is None:
+            return None
+        available = [name for name, source, convert in cls.get_fast_fields()]
+        for param, names in (('fields', fields), ('exclude', exclude)):
+            unknown = sorted(set(names or ()) - set(available))
+            if unknown:
+                raise ValidationError({param: [f"Unknown field(s): {', '.join(unknown)}."]})
+        selected = [name for name in available if fields is None or name in fields]
+        return [name for name in selected if name not in (exclude or ())]
+
+    @classmethod
+    def get_sources(cls, names=None):
+        """Model fields read to render ``names`` (every field by default)"""
+        sources = []
+        for name, source, convert in cls.get_fast_fields(names):
+            for field in [source] if source else cls.field_dependencies.get(name, []):
+                if field not in sources:
+                    sources.append(field)
+        if '_id' not in sources:
+            sources.insert(0, '_id')
+        return sources
+
+
+class FastRepresentationMixin(SparseFieldsMixin):
+    """
+    Renders rows fetched with ``.values()`` in a single pass.
+
+    The output matches ``to_representation`` on model instances, but each
+    value only goes through a cheap per-field converter instead of the
+    full serializer machinery. A ``SerializerMethodField`` named ``x`` is
+    filled in by a ``fast_x(row, context)`` classmethod, with ``context``
+    built once per batch by ``get_fast_context``.
+    """
+
+    @classmethod
+    def get_fast_fields(cls, names=None):
+        if '_fast_fields' not in cls.__dict__:
+            fields = []
+            for name, field in cls().fields.items():
+                if field.write_only:
+                    continue
+                if isinstance(field, serializers.SerializerMethodField):
+                    fields.append((name, None, getattr(cls, f'fast_{name}')))
+                else:
+                    fields.append((name, field.source, _fast_converter(field)))
+            cls._fast_fields = fields
+        if names is None:
+            return cls._fast_fields
+        return [field for field in cls._fast_fields if field[0] in names]
+
+    @classmethod
+    def get_fast_sources(cls, names=None):
+        """Model fields to project for the fast path"""
+        return cls.get_sources(names)
+
+    @classmethod
+    def get_fast_context(cls, rows, names=None):
+        return {}
+
+    @classmethod
+    async def aget_fast_context(cls, rows, names, database):
+        """``get_fast_context`` for the async read path; must not touch the ORM"""
+        return {}
+
+    @timed('serialize')
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
+    @classmethod
+    @timed('serialize')
+    def to_fast_representation(cls, rows, names=None, context=None):
+        fields = cls.get_fast_fields(names)
+        if context is None:
+            context = cls.get_fast_context(rows, names)
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, convert in fields:
+                if source is None:
+                    item[name] = convert(row, context)
+                    continue
+                value = row[source]
+                item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
+
+
+def _fast_converter(field):
+    """A converter equivalent to field.to_representation for raw values"""
+    if isinstance(field, serializers.ModelField):
+        return str
+    if isinstance(field, serializers.CharField):
+        return None
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.FloatField):
+        return float
+    return field.to_representation
 
 
-class UserSerializer(serializers.ModelSerializer):
-    team_name = serializers.SerializerMethodField()
-    
+class UserSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['_id', 'username', 'email', 'first_name', 'last_name', 'password', 'team_id', 'team_name', 'date_joined']
+        read_only_fields = ['team_name']
         extra_kwargs = {'password': {'write_only': True}}
 
-    def get_team_name(self, obj):
-        if obj.team_id:
-            try:
-                from .models import Team
-                from bson import ObjectId
-                team = Team.objects.get(_id=ObjectId(obj.team_id))
-                return team.name
-            except (Team.DoesNotExist, Exception):
-                return None
-        return None
-
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         if representation.get('_id'):
@@ -28,7 +140,7 @@ class UserSerializer(serializers.ModelSerializer):
         return representation
 
 
-class TeamSerializer(serializers.ModelSerializer):
+class TeamSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Team
         fields = ['_id', 'name', 'description', 'created_at']
@@ -40,7 +152,7 @@ class TeamSerializer(serializers.ModelSerializer):
         return representation
 
 
-class ActivitySerializer(serializers.ModelSerializer):
+class ActivitySerializer(FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Activity
         fields = ['_id', 'user_id', 'activity_type', 'duration', 'calories', 'distance', 'date', 'notes']
@@ -52,7 +164,7 @@ class ActivitySerializer(serializers.ModelSerializer):
         return representation
 
 
-class LeaderboardSerializer(serializers.ModelSerializer):
+class LeaderboardSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Leaderboard
         fields = ['_id', 'user_id', 'user_name', 'team_id', 'team_name', 'total_calories', 'total_activities', 'total_distance', 'rank']
@@ -64,7 +176,56 @@ class LeaderboardSerializer(serializers.ModelSerializer):
         return representation
 
 
-class WorkoutSerializer(serializers.ModelSerializer):
+def _per_member(total, member_count):
+    return round(total / member_count, 2) if member_count else 0.0
+
+
+class TeamLeaderboardSerializer(FastRepresentationMixin, serializers.ModelSerializer):
+    average_calories = serializers.SerializerMethodField()
+    average_activities = serializers.SerializerMethodField()
+    average_distance = serializers.SerializerMethodField()
+    field_dependencies = {
+        'average_calories': ['total_calories', 'member_count'],
+        'average_activities': ['total_activities', 'member_count'],
+        'average_distance': ['total_distance', 'member_count'],
+    }
+
+    class Meta:
+        model = TeamLeaderboard
+        fields = [
+            '_id', 'team_id', 'team_name', 'member_count', 'total_calories', 'total_activities', 'total_distance',
+            'average_calories', 'average_activities', 'average_distance', 'rank',
+        ]
+
+    def get_average_calories(self, obj):
+        return _per_member(obj.total_calories, obj.member_count)
+
+    def get_average_activities(self, obj):
+        return _per_member(obj.total_activities, obj.member_count)
+
+    def get_average_distance(self, obj):
+        return _per_member(obj.total_distance, obj.member_count)
+
+    @classmethod
+    def fast_average_calories(cls, row, context):
+        return _per_member(row['total_calories'], row['member_count'])
+
+    @classmethod
+    def fast_average_activities(cls, row, context):
+        return _per_member(row['total_activities'], row['member_count'])
+
+    @classmethod
+    def fast_average_distance(cls, row, context):
+        return _per_member(row['total_distance'], row['member_count'])
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        if representation.get('_id'):
+            representation['_id'] = str(representation['_id'])
+        return representation
+
+
+class WorkoutSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Workout
         fields = ['_id', 'name', 'description', 'activity_type', 'difficulty', 'duration', 'calories', 'instructions']
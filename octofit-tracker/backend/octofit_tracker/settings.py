@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'octofit_tracker.performance.performance_middleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -89,14 +90,23 @@ WSGI_APPLICATION = 'octofit_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# The octofit_tracker.db engine is djongo with one long-lived, fork-safe
+# client per worker (see pool.py). The CLIENT options size its pool and
+# are shared with the motor clients of the async read path.
 DATABASES = {
     'default': {
-        'ENGINE': 'djongo',
+        'ENGINE': 'octofit_tracker.db',
         'NAME': 'octofit_db',
         'ENFORCE_SCHEMA': False,
         'CLIENT': {
             'host': 'localhost',
             'port': 27017,
+            'maxPoolSize': int(os.environ.get('OCTOFIT_MONGO_MAX_POOL_SIZE', '100')),
+            'minPoolSize': int(os.environ.get('OCTOFIT_MONGO_MIN_POOL_SIZE', '0')),
+            'maxIdleTimeMS': int(os.environ.get('OCTOFIT_MONGO_MAX_IDLE_MS', '300000')),
+            'waitQueueTimeoutMS': int(os.environ.get('OCTOFIT_MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000')),
+            'connectTimeoutMS': int(os.environ.get('OCTOFIT_MONGO_CONNECT_TIMEOUT_MS', '5000')),
+            'serverSelectionTimeoutMS': int(os.environ.get('OCTOFIT_MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
         }
     }
 }
@@ -153,14 +163,99 @@ CORS_ALLOW_METHODS = [
     'POST',
     'PUT',
 ]
+CORS_EXPOSE_HEADERS = [
+    'etag',
+    'last-modified',
+    'server-timing',
+    'x-query-index',
+    'x-unindexed-filters',
+]
 CORS_ALLOW_HEADERS = [
     'accept',
     'accept-encoding',
     'authorization',
     'content-type',
     'dnt',
+    'if-modified-since',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
 ]
+
+# Django REST Framework
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'octofit_tracker.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Serve JSON list/retrieve requests from projected rows instead of
+# building a model instance and serializer per row
+OCTOFIT_FAST_READS = os.environ.get('OCTOFIT_FAST_READS', '1') == '1'
+
+# Serve activity JSON reads and creates with pymongo directly, skipping
+# djongo's SQL translation (see activity_repository.py)
+OCTOFIT_ACTIVITY_REPOSITORY = os.environ.get('OCTOFIT_ACTIVITY_REPOSITORY', '0') == '1'
+
+# The leaderboard top-N cache lives in process memory unless a shared
+# backend is configured, e.g.
+# OCTOFIT_LEADERBOARD_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# OCTOFIT_LEADERBOARD_CACHE_LOCATION=redis://127.0.0.1:6379
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'leaderboard': {
+        'BACKEND': os.environ.get(
+            'OCTOFIT_LEADERBOARD_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('OCTOFIT_LEADERBOARD_CACHE_LOCATION', 'octofit-leaderboard'),
+        'TIMEOUT': int(os.environ.get('OCTOFIT_LEADERBOARD_CACHE_TTL', '60')),
+    },
+}
+
+# Largest slice served by /api/leaderboard/top/; each cached slice holds this many entries
+OCTOFIT_LEADERBOARD_TOP_N = int(os.environ.get('OCTOFIT_LEADERBOARD_TOP_N', '100'))
+
+# Serve JSON list/retrieve GETs from async views backed by motor. asgi.py
+# turns this on; under WSGI every request would need its own event loop.
+OCTOFIT_ASYNC_READS = os.environ.get('OCTOFIT_ASYNC_READS', '0') == '1'
+
+# Seconds between leaderboard checks for the live stream; writes inside one
+# window are pushed to subscribers as a single frame
+OCTOFIT_LIVE_WINDOW = float(os.environ.get('OCTOFIT_LIVE_WINDOW', '0.5'))
+
+# Share of requests (0 to 1) that get a Server-Timing header and a log line
+# with their Mongo, serializer and render times
+OCTOFIT_PERF_SAMPLE_RATE = float(os.environ.get('OCTOFIT_PERF_SAMPLE_RATE', '1' if DEBUG else '0.01'))
+
+# Mongo commands taking at least this many milliseconds are written, with
+# the SQL djongo translated them from, to OCTOFIT_SLOWOPS_LOG for
+# `manage.py slowops`. Set to an empty string to turn the log off.
+OCTOFIT_SLOWOPS_THRESHOLD_MS = os.environ.get('OCTOFIT_SLOWOPS_THRESHOLD_MS', '100')
+OCTOFIT_SLOWOPS_THRESHOLD_MS = float(OCTOFIT_SLOWOPS_THRESHOLD_MS) if OCTOFIT_SLOWOPS_THRESHOLD_MS else None
+OCTOFIT_SLOWOPS_LOG = os.environ.get('OCTOFIT_SLOWOPS_LOG', str(BASE_DIR / 'slowops.ndjson'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slowops': {'class': 'logging.FileHandler', 'filename': OCTOFIT_SLOWOPS_LOG, 'delay': True},
+    },
+    'loggers': {
+        'octofit_tracker.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('OCTOFIT_PERF_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'octofit_tracker.slowops': {
+            'handlers': ['slowops'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
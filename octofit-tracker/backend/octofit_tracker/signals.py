@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import team_leaderboard, team_names, versions
+from .models import Activity, Leaderboard, Team, User, Workout
+
+VERSIONED_MODELS = (User, Team, Activity, Leaderboard, Workout)
+
+
+@receiver([post_save, post_delete])
+def bump_collection_version(sender, **kwargs):
+    """Bump the collection version on every ORM write, including the admin"""
+    if sender in VERSIONED_MODELS:
+        versions.bump(sender)
+
+
+@receiver(pre_save, sender=User)
+def copy_team_name(sender, instance, **kwargs):
+    """Store the user's team name next to its id, remembering the team it replaces"""
+    instance.team_name = team_names.name_of(instance.team_id) if instance.team_id else None
+    instance._stored_team_id = None
+    if not instance._state.adding:
+        instance._stored_team_id = team_leaderboard.teams_of([str(instance._id)]).get(str(instance._id))
+
+
+@receiver(post_save, sender=User)
+def sync_leaderboard_team(sender, instance, created, **kwargs):
+    """A user changing teams takes their leaderboard entry and totals along"""
+    if not created:
+        team_names.sync_user(instance)
+    team_leaderboard.change_team(str(instance._id), getattr(instance, '_stored_team_id', None), instance.team_id)
+
+
+@receiver(post_delete, sender=User)
+def leave_team(sender, instance, **kwargs):
+    team_leaderboard.remove_member(instance.team_id)
+
+
+@receiver(post_save, sender=Team)
+def rename_team(sender, instance, created, **kwargs):
+    if not created:
+        team_names.propagate(str(instance._id), instance.name)
+
+
+@receiver(post_delete, sender=Team)
+def clear_team_name(sender, instance, **kwargs):
+    team_names.propagate(str(instance._id), None)
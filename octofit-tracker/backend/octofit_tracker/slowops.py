@@ -0,0 +1,162 @@
+"""Log of slow Mongo commands and the SQL djongo translated them from.
+
+Every SQL statement djongo executes is remembered in the current context
+through a connection execute wrapper. A pymongo command listener times
+each command and, when it takes at least ``OCTOFIT_SLOWOPS_THRESHOLD_MS``,
+writes one JSON line to the ``octofit_tracker.slowops`` logger with the
+SQL, the Mongo command, its normalized shape, the duration and the number
+of documents returned. djongo sends its commands lazily while rows are
+fetched, so a command is attributed to the last statement that named its
+collection; commands sent through pymongo directly have no SQL.
+
+``manage.py slowops`` aggregates the log by query shape.
+"""
+import logging
+import re
+from collections.abc import Mapping
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from bson import json_util
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from pymongo import monitoring
+
+logger = logging.getLogger('octofit_tracker.slowops')
+
+# Session and routing fields that differ between otherwise identical commands
+VOLATILE_KEYS = {'lsid', '$db', '$clusterTime', 'txnNumber', '$readPreference'}
+# Values under these keys describe the query rather than parameterize it
+STRUCTURAL_KEYS = {'sort', '$sort', 'projection', '$project', 'hint'}
+MAX_LOGGED_ITEMS = 5
+
+_statement = ContextVar('octofit_sql_statement', default=None)
+_pending = {}
+
+
+def capture_statement(execute, sql, params, many, context):
+    """Connection execute wrapper remembering the statement being run"""
+    _statement.set((sql, None if many else params))
+    return execute(sql, params, many, context)
+
+
+def command_collection(event):
+    if event.command_name == 'getMore':
+        return event.command.get('collection')
+    return event.command.get(event.command_name)
+
+
+def returned_count(reply):
+    """Documents in a cursor batch, or the ``n`` of a count or write"""
+    cursor = reply.get('cursor')
+    if isinstance(cursor, Mapping):
+        batch = cursor.get('firstBatch', cursor.get('nextBatch'))
+        return None if batch is None else len(batch)
+    count = reply.get('n')
+    return count if isinstance(count, int) else None
+
+
+def command_shape(command):
+    """The command with its literal values replaced by ``?``"""
+    name, collection = next(iter(command.items()))
+    return dict({name: collection}, **{
+        key: _shape(value, key in STRUCTURAL_KEYS)
+        for key, value in list(command.items())[1:] if key not in VOLATILE_KEYS
+    })
+
+
+def _shape(value, structural=False):
+    if isinstance(value, Mapping):
+        return {
+            key: _shape(item, structural or key in STRUCTURAL_KEYS)
+            for key, item in value.items() if key not in VOLATILE_KEYS
+        }
+    if isinstance(value, (list, tuple)):
+        items = [_shape(item, structural) for item in value]
+        if structural:
+            return items
+        # An $in over ten ids has the same shape as one over two
+        unique = []
+        for item in items:
+            if item not in unique:
+                unique.append(item)
+        return unique
+    if structural or (isinstance(value, str) and value.startswith('$')):
+        return value
+    return '?'
+
+
+def sql_shape(sql):
+    """The statement with IN lists collapsed and LIMIT/OFFSET values hidden"""
+    if not sql:
+        return None
+    sql = re.sub(r'%s(?:\s*,\s*%s)+', '%s, ...', sql)
+    return re.sub(r'\b(LIMIT|OFFSET)\s+\d+', r'\1 ?', sql)
+
+
+def _truncate(value):
+    """Keep logged commands short: long arrays (insert batches, $in lists) are cut"""
+    if isinstance(value, Mapping):
+        return {key: _truncate(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        items = [_truncate(item) for item in value[:MAX_LOGGED_ITEMS]]
+        if len(value) > MAX_LOGGED_ITEMS:
+            items.append(f'... {len(value) - MAX_LOGGED_ITEMS} more')
+        return items
+    return value
+
+
+class _Listener(monitoring.CommandListener):
+
+    def started(self, event):
+        if settings.OCTOFIT_SLOWOPS_THRESHOLD_MS is None:
+            return
+        collection = command_collection(event)
+        statement = _statement.get()
+        if statement is not None and f'"{collection}"' not in statement[0]:
+            statement = None
+        _pending[event.request_id] = (event.command, collection, statement)
+
+    def succeeded(self, event):
+        self.finished(event, returned_count(event.reply))
+
+    def failed(self, event):
+        self.finished(event, None, failed=True)
+
+    def finished(self, event, documents, failed=False):
+        pending = _pending.pop(event.request_id, None)
+        threshold = settings.OCTOFIT_SLOWOPS_THRESHOLD_MS
+        duration = event.duration_micros / 1000
+        if pending is None or threshold is None or duration < threshold:
+            return
+        command, collection, statement = pending
+        sql, params = statement or (None, None)
+        logger.warning(json_util.dumps({
+            'time': datetime.now(timezone.utc).isoformat(),
+            'sql': sql,
+            'params': params,
+            'command_name': event.command_name,
+            'collection': collection,
+            'command': _truncate(command),
+            'shape': command_shape(command),
+            'duration_ms': duration,
+            'documents': documents,
+            'failed': failed,
+        }, default=str))
+
+
+def _add_wrapper(sender, connection, **kwargs):
+    if capture_statement not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture_statement)
+
+
+_installed = False
+
+
+def install():
+    """Register the listener and the execute wrapper; must run before any MongoClient exists"""
+    global _installed
+    if not _installed:
+        monitoring.register(_Listener())
+        connection_created.connect(_add_wrapper)
+        _installed = True
@@ -0,0 +1,154 @@
+"""Activity statistics computed with MongoDB aggregation pipelines.
+
+Totals are grouped inside the database and returned as plain documents,
+so no model instances are built no matter how many activities match.
+"""
+from datetime import datetime, time, timedelta, timezone
+
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import Activity, User
+from .mongo import get_collection, to_object_id_expression
+
+PERIOD_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%G-W%V',
+    'month': '%Y-%m',
+}
+
+TOTALS = {
+    'total_calories': {'$sum': '$calories'},
+    'total_duration': {'$sum': '$duration'},
+    'total_distance': {'$sum': {'$ifNull': ['$distance', 0]}},
+    'activity_count': {'$sum': 1},
+}
+
+
+def parse_filters(params):
+    """Read the period, date range and scope filters from query params"""
+    period = params.get('period')
+    if period and period not in PERIOD_FORMATS:
+        raise ValidationError({'period': [f"Must be one of: {', '.join(PERIOD_FORMATS)}."]})
+    return {
+        'period': period,
+        'start': _parse_bound(params, 'start'),
+        'end': _parse_bound(params, 'end', inclusive_day=True),
+        'user_id': params.get('user_id'),
+        'team_id': params.get('team_id'),
+        'activity_type': params.get('activity_type'),
+    }
+
+
+def _parse_bound(params, name, inclusive_day=False):
+    value = params.get(name)
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: ['Expected an ISO 8601 date or datetime.']})
+        moment = datetime.combine(day, time.min)
+        if inclusive_day:
+            moment += timedelta(days=1)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def match_stage(start=None, end=None, user_id=None, team_id=None, activity_type=None):
+    """Build the $match stage for the activity filters"""
+    match = {}
+    if start or end:
+        match['date'] = {}
+        if start:
+            match['date']['$gte'] = start
+        if end:
+            match['date']['$lt'] = end
+    if user_id:
+        match['user_id'] = user_id
+    if team_id:
+        members = get_collection(User).find({'team_id': team_id}, {'_id': 1})
+        member_ids = [str(member['_id']) for member in members]
+        if user_id:
+            match['user_id'] = user_id if user_id in member_ids else {'$in': []}
+        else:
+            match['user_id'] = {'$in': member_ids}
+    if activity_type:
+        match['activity_type'] = activity_type
+    return {'$match': match}
+
+
+def _group_key(field, period):
+    key = {field: f'${field}'}
+    if period:
+        key['period'] = {'$dateToString': {'format': PERIOD_FORMATS[period], 'date': '$date'}}
+    return key
+
+
+def _flatten():
+    """Promote the compound group key back to top-level fields"""
+    return {'$replaceRoot': {'newRoot': {'$mergeObjects': ['$_id', {
+        name: f'${name}' for name in TOTALS
+    }]}}}
+
+
+def _sort(period):
+    sort = {'period': 1} if period else {}
+    sort['total_calories'] = -1
+    return {'$sort': sort}
+
+
+def by_user(period=None, **filters):
+    """Totals per user, optionally per period bucket"""
+    pipeline = [
+        match_stage(**filters),
+        {'$group': dict(_id=_group_key('user_id', period), **TOTALS)},
+        _flatten(),
+        _sort(period),
+    ]
+    return list(get_collection(Activity).aggregate(pipeline))
+
+
+def by_activity_type(period=None, **filters):
+    """Totals per activity type, optionally per period bucket"""
+    pipeline = [
+        match_stage(**filters),
+        {'$group': dict(_id=_group_key('activity_type', period), **TOTALS)},
+        _flatten(),
+        _sort(period),
+    ]
+    return list(get_collection(Activity).aggregate(pipeline))
+
+
+def by_team(period=None, **filters):
+    """
+    Totals per team, optionally per period bucket.
+
+    Activities are first reduced to one row per user (and bucket) so the
+    join to ``users``, which also supplies the team name, runs once per
+    user rather than once per activity.
+    """
+    regroup_key = {'team_id': '$user.team_id', 'team_name': {'$ifNull': ['$user.team_name', None]}}
+    if period:
+        regroup_key['period'] = '$_id.period'
+    pipeline = [
+        match_stage(**filters),
+        {'$group': dict(_id=_group_key('user_id', period), **TOTALS)},
+        {'$lookup': {
+            'from': User._meta.db_table,
+            'let': {'user_id': '$_id.user_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$_id', to_object_id_expression('$$user_id')]}}},
+                {'$project': {'team_id': 1, 'team_name': 1}},
+            ],
+            'as': 'user',
+        }},
+        {'$unwind': '$user'},
+        {'$group': dict(_id=regroup_key, **{name: {'$sum': f'${name}'} for name in TOTALS})},
+        _flatten(),
+        _sort(period),
+    ]
+    return list(get_collection(Activity).aggregate(pipeline))
+
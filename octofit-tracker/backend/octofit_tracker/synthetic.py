@@ -0,0 +1,139 @@
+"""Deterministic synthetic teams, users and activities for load testing.
+
+Every row is derived from ``(seed, kind, index)``, so the same options
+always produce the same documents and ids. Nothing here imports Django:
+chunks are written from worker processes, each with its own MongoClient.
+"""
+import random
+from datetime import timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+ID_EPOCH = 1704067200  # 2024-01-01T00:00:00Z, stamped into every synthetic id
+ID_KINDS = {'team': 1, 'user': 2, 'activity': 3}
+
+TEAM_NAMES = [
+    'Aurora', 'Comets', 'Falcons', 'Glaciers', 'Harriers', 'Lynx', 'Meteors',
+    'Nomads', 'Orcas', 'Pioneers', 'Rapids', 'Summit', 'Tempest', 'Vanguard',
+]
+FIRST_NAMES = [
+    'Alex', 'Amara', 'Ben', 'Chen', 'Dana', 'Diego', 'Elif', 'Farah', 'Hana',
+    'Ivan', 'Jonas', 'Kai', 'Lena', 'Mateo', 'Nia', 'Omar', 'Priya', 'Quinn',
+    'Rosa', 'Sam', 'Tariq', 'Uma', 'Viktor', 'Wen', 'Yara', 'Zoe',
+]
+LAST_NAMES = [
+    'Adams', 'Bauer', 'Costa', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Haddad',
+    'Ito', 'Jensen', 'Kowalski', 'Lopez', 'Moreau', 'Novak', 'Okafor', 'Patel',
+    'Rossi', 'Silva', 'Tanaka', 'Weber', 'Yilmaz', 'Zhang',
+]
+# activity type: (kcal per minute range, km/h range or None)
+ACTIVITY_PROFILES = {
+    'Running': ((8, 13), (7, 13)),
+    'Cycling': ((6, 11), (15, 30)),
+    'Swimming': ((7, 11), (2, 4)),
+    'Weightlifting': ((4, 7), None),
+    'Boxing': ((9, 13), None),
+    'Yoga': ((2, 4), None),
+    'HIIT': ((10, 14), None),
+}
+NOTES = ['Felt strong', 'Easy recovery session', 'New personal best', 'Tough one', 'Group session']
+
+
+def synthetic_id(kind, index):
+    """A stable ObjectId for the index-th synthetic row of a kind"""
+    return ObjectId(ID_EPOCH.to_bytes(4, 'big') + bytes([ID_KINDS[kind]]) + index.to_bytes(7, 'big'))
+
+
+def _rng(options, kind, index):
+    # One generator per row (per user for activities), so chunking never changes the data
+    return random.Random(f"{options['seed']}:{kind}:{index}")
+
+
+def team_name(index):
+    """The name of the index-th synthetic team"""
+    name = TEAM_NAMES[index % len(TEAM_NAMES)]
+    if index >= len(TEAM_NAMES):
+        name = f'{name} {index // len(TEAM_NAMES) + 1}'
+    return f'Team {name}'
+
+
+def generate_teams(options):
+    teams = []
+    for index in range(options['teams']):
+        rng = _rng(options, 'team', index)
+        teams.append({
+            '_id': synthetic_id('team', index),
+            'name': team_name(index),
+            'description': f'Synthetic team {index + 1} for load testing.',
+            'created_at': options['end'] - timedelta(days=options['days'] + rng.randint(30, 365)),
+        })
+    return teams
+
+
+def generate_users(start, stop, options):
+    users = []
+    for index in range(start, stop):
+        rng = _rng(options, 'user', index)
+        users.append({
+            '_id': synthetic_id('user', index),
+            'username': f'athlete{index:08d}',
+            'email': f'athlete{index:08d}@octofit.example',
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'password': f'synthetic-{index}',
+            'team_id': str(synthetic_id('team', index % options['teams'])),
+            'team_name': team_name(index % options['teams']),
+            'date_joined': options['end'] - timedelta(days=options['days'] + rng.randint(0, 365)),
+        })
+    return users
+
+
+def generate_activities(start, stop, options):
+    """Activities for users ``start`` to ``stop``"""
+    per_user = options['activities_per_user']
+    window = options['days'] * 86400
+    activity_types = list(ACTIVITY_PROFILES)
+    activities = []
+    for user_index in range(start, stop):
+        rng = _rng(options, 'activity', user_index)
+        user_id = str(synthetic_id('user', user_index))
+        favourites = rng.sample(activity_types, 3)
+        for offset in range(per_user):
+            activity_type = rng.choice(favourites) if rng.random() < 0.8 else rng.choice(activity_types)
+            (kcal_low, kcal_high), speed = ACTIVITY_PROFILES[activity_type]
+            duration = rng.randint(15, 90)
+            distance = None
+            if speed:
+                distance = round(duration / 60 * rng.uniform(*speed), 2)
+            activities.append({
+                '_id': synthetic_id('activity', user_index * per_user + offset),
+                'user_id': user_id,
+                'activity_type': activity_type,
+                'duration': duration,
+                'calories': int(duration * rng.uniform(kcal_low, kcal_high)),
+                'distance': distance,
+                'date': options['end'] - timedelta(seconds=rng.randrange(window)),
+                'notes': rng.choice(NOTES) if rng.random() < 0.2 else None,
+            })
+    return activities
+
+
+GENERATORS = {
+    'users': generate_users,
+    'activities': generate_activities,
+}
+
+_clients = {}
+
+
+def write_chunk(task):
+    """Generate and insert one chunk; runs inside a worker process"""
+    collection, start, stop, options = task
+    key = repr(sorted(options['client'].items()))
+    if key not in _clients:
+        _clients[key] = MongoClient(**options['client'])
+    documents = GENERATORS[collection](start, stop, options)
+    if documents:
+        _clients[key][options['database']][collection].insert_many(documents, ordered=False)
+    return len(documents)
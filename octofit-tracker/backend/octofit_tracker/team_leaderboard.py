@@ -0,0 +1,174 @@
+"""Incremental maintenance of the team leaderboard collection.
+
+Each entry holds one team's member count and the sum of its members'
+leaderboard totals, ranked on ``total_calories`` the way leaderboard.py
+ranks users. Activity writes are folded into per-team deltas through
+each author's stored ``team_id``, and a user joining, leaving or changing
+team carries their totals between entries, so serving the board is one
+indexed read however large the teams are.
+"""
+from collections import defaultdict
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+from . import leaderboard, team_names, versions
+from .models import Leaderboard, TeamLeaderboard, User
+from .mongo import get_collection
+
+TOTALS = ('total_calories', 'total_activities', 'total_distance')
+SCORE_FIELD = leaderboard.SCORE_FIELD
+RECOMPUTE_CHUNK_SIZE = 1000
+
+
+def _empty_delta():
+    return {'total_calories': 0, 'total_activities': 0, 'total_distance': 0.0, 'member_count': 0}
+
+
+def teams_of(user_ids):
+    """Map user ids to their stored team ids, leaving out users without a team"""
+    object_ids = []
+    for user_id in set(user_ids):
+        try:
+            object_ids.append(ObjectId(user_id))
+        except (InvalidId, TypeError):
+            continue
+    if not object_ids:
+        return {}
+    users = get_collection(User).find({'_id': {'$in': object_ids}, 'team_id': {'$nin': [None, '']}}, {'team_id': 1})
+    return {str(user['_id']): user['team_id'] for user in users}
+
+
+def team_deltas(user_deltas):
+    """Fold per-user total deltas into per-team deltas"""
+    teams = teams_of(user_deltas)
+    deltas = defaultdict(_empty_delta)
+    for user_id, delta in user_deltas.items():
+        if user_id in teams:
+            for field in TOTALS:
+                deltas[teams[user_id]][field] += delta[field]
+    return dict(deltas)
+
+
+def record_activities(added=(), removed=()):
+    """Apply the team leaderboard changes caused by activity writes"""
+    apply_deltas(team_deltas(leaderboard.activity_deltas(added=added, removed=removed)))
+
+
+def change_team(user_id, old_team_id, new_team_id):
+    """Move a user's membership and leaderboard totals from one team to another"""
+    if old_team_id == new_team_id:
+        return
+    entry = get_collection(Leaderboard).find_one({'user_id': user_id}, dict.fromkeys(TOTALS, 1)) or {}
+    deltas = {}
+    for team_id, sign in ((old_team_id, -1), (new_team_id, 1)):
+        if team_id:
+            deltas[team_id] = dict({field: sign * entry.get(field, 0) for field in TOTALS}, member_count=sign)
+    apply_deltas(deltas)
+
+
+def remove_member(team_id):
+    """Drop a deleted user from their team's member count"""
+    if team_id:
+        apply_deltas({team_id: dict(_empty_delta(), member_count=-1)})
+
+
+def apply_deltas(deltas):
+    """Apply per-team deltas and move the affected ranks"""
+    collection = get_collection(TeamLeaderboard)
+    changed = False
+    for team_id, delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        changed = True
+        entry = collection.find_one_and_update(
+            {'team_id': team_id},
+            {'$inc': delta, '$setOnInsert': {'rank': 0}},
+            projection={SCORE_FIELD: 1, 'rank': 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        if entry is None:
+            _insert_entry(collection, team_id, delta[SCORE_FIELD])
+            continue
+        old_score = entry[SCORE_FIELD]
+        new_score = old_score + delta[SCORE_FIELD]
+        if new_score != old_score:
+            shift = leaderboard.move_entry(collection, entry['_id'], old_score, new_score)
+            if shift:
+                collection.update_one({'_id': entry['_id']}, {'$inc': {'rank': shift}})
+    if changed:
+        versions.bump(TeamLeaderboard)
+
+
+def recompute(team_ids):
+    """
+    Bring the entries of ``team_ids`` back in line with their members.
+
+    Totals are re-summed from those teams' leaderboard entries and the
+    differences applied as deltas, so other teams only have ranks moved.
+    """
+    team_ids = [team_id for team_id in set(team_ids) if team_id]
+    for start in range(0, len(team_ids), RECOMPUTE_CHUNK_SIZE):
+        chunk = team_ids[start:start + RECOMPUTE_CHUNK_SIZE]
+        expected = _team_totals({'team_id': {'$in': chunk}})
+        current = {
+            entry['team_id']: entry
+            for entry in get_collection(TeamLeaderboard).find({'team_id': {'$in': chunk}})
+        }
+        apply_deltas({
+            team_id: {
+                field: expected.get(team_id, {}).get(field, 0) - current.get(team_id, {}).get(field, 0)
+                for field in _empty_delta()
+            }
+            for team_id in chunk
+        })
+
+
+def rebuild():
+    """Recompute every entry from the leaderboard and users collections"""
+    teams = _team_totals({'team_id': {'$nin': [None, '']}})
+    ranked = sorted(teams.items(), key=lambda item: item[1][SCORE_FIELD], reverse=True)
+    entries, rank, previous_score = [], 0, None
+    for position, (team_id, totals) in enumerate(ranked, start=1):
+        if totals[SCORE_FIELD] != previous_score:
+            rank, previous_score = position, totals[SCORE_FIELD]
+        entries.append(dict(
+            totals, team_id=team_id, team_name=totals['team_name'] or '',
+            total_distance=round(totals['total_distance'], 2), rank=rank,
+        ))
+
+    collection = get_collection(TeamLeaderboard)
+    collection.delete_many({})
+    if entries:
+        collection.insert_many(entries, ordered=False)
+    versions.bump(TeamLeaderboard)
+
+
+def _team_totals(match):
+    """Member counts, names and summed leaderboard totals of the teams matching ``match``"""
+    teams = defaultdict(lambda: dict(_empty_delta(), team_name=None))
+    for row in get_collection(User).aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$team_id', 'member_count': {'$sum': 1}, 'team_name': {'$first': '$team_name'}}},
+    ]):
+        teams[row['_id']].update(member_count=row['member_count'], team_name=row['team_name'])
+    for row in get_collection(Leaderboard).aggregate([
+        {'$match': match},
+        {'$group': dict(_id='$team_id', **{field: {'$sum': f'${field}'} for field in TOTALS})},
+    ]):
+        teams[row['_id']].update({field: row[field] for field in TOTALS})
+    return dict(teams)
+
+
+def _insert_entry(collection, team_id, score):
+    """Fill in a freshly upserted entry's name and rank"""
+    collection.update_many(
+        {SCORE_FIELD: {'$lt': score}, 'team_id': {'$ne': team_id}},
+        {'$inc': {'rank': 1}},
+    )
+    rank = 1 + collection.count_documents({SCORE_FIELD: {'$gt': score}})
+    collection.update_one(
+        {'team_id': team_id}, {'$set': {'team_name': team_names.name_of(team_id) or '', 'rank': rank}}
+    )
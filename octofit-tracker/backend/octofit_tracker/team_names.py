@@ -0,0 +1,109 @@
+"""Team names copied onto the documents that display them.
+
+Users, leaderboard entries and team leaderboard entries carry their
+team's name next to its id, so reading them never needs a second lookup
+in ``teams``. Saving a user copies its team's name in, and renaming or
+deleting a team rewrites every copy with one ``update_many`` per
+collection through the ``team_id`` indexes (see signals.py). ``repair``
+re-derives every copy from ``teams`` and ``users`` for when a write went
+around the ORM.
+"""
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+
+from . import versions
+from .models import Leaderboard, Team, TeamLeaderboard, User
+from .mongo import get_collection, to_object_id_expression
+
+# Collections holding a copy, with the value they store for "no team"
+COPIES = ((User, None), (Leaderboard, ''), (TeamLeaderboard, ''))
+REPAIR_CHUNK_SIZE = 1000
+
+
+def name_of(team_id):
+    """The name of a team, or None when there is no such team"""
+    try:
+        team = get_collection(Team).find_one({'_id': ObjectId(team_id)}, {'name': 1})
+    except (InvalidId, TypeError):
+        return None
+    return None if team is None else team.get('name')
+
+
+def propagate(team_id, name):
+    """
+    Write a team's name onto every copy; ``None`` clears them (team deleted).
+
+    Returns the number of documents changed per model.
+    """
+    changed = {}
+    for model, empty in COPIES:
+        value = empty if name is None else name
+        changed[model] = get_collection(model).update_many(
+            {'team_id': team_id, 'team_name': {'$ne': value}}, {'$set': {'team_name': value}}
+        ).modified_count
+        if changed[model]:
+            versions.bump(model)
+    return changed
+
+
+def sync_user(user):
+    """Copy a user's team onto their leaderboard entry"""
+    result = get_collection(Leaderboard).update_one(
+        {'user_id': str(user._id)},
+        {'$set': {'team_id': user.team_id or '', 'team_name': user.team_name or ''}},
+    )
+    if result.modified_count:
+        versions.bump(Leaderboard)
+
+
+def repair():
+    """
+    Bring every copy back in line with ``teams`` and ``users``.
+
+    Returns the number of documents changed per model.
+    """
+    names = {str(team['_id']): team.get('name') for team in get_collection(Team).find({}, {'name': 1})}
+
+    repaired = dict.fromkeys([model for model, empty in COPIES], 0)
+    for model, empty in ((User, None), (TeamLeaderboard, '')):
+        collection = get_collection(model)
+        for team_id, name in names.items():
+            repaired[model] += collection.update_many(
+                {'team_id': team_id, 'team_name': {'$ne': name}}, {'$set': {'team_name': name}}
+            ).modified_count
+        # Copies of a team that no longer exists
+        repaired[model] += collection.update_many(
+            {'team_id': {'$nin': list(names)}, 'team_name': {'$ne': empty}}, {'$set': {'team_name': empty}}
+        ).modified_count
+
+    # Leaderboard entries also copy their user's team id, which can drift too
+    entries = get_collection(Leaderboard)
+    rows = entries.aggregate([
+        {'$lookup': {
+            'from': User._meta.db_table,
+            'let': {'user_id': '$user_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$_id', to_object_id_expression('$$user_id')]}}},
+                {'$project': {'team_id': 1}},
+            ],
+            'as': 'user',
+        }},
+        {'$project': {'team_id': 1, 'team_name': 1, 'user_team_id': {'$arrayElemAt': ['$user.team_id', 0]}}},
+    ])
+    updates = []
+    for row in rows:
+        team_id = row.get('user_team_id') or ''
+        team_name = names.get(team_id) or ''
+        if (row.get('team_id'), row.get('team_name')) != (team_id, team_name):
+            updates.append(UpdateOne({'_id': row['_id']}, {'$set': {'team_id': team_id, 'team_name': team_name}}))
+        if len(updates) >= REPAIR_CHUNK_SIZE:
+            repaired[Leaderboard] += entries.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        repaired[Leaderboard] += entries.bulk_write(updates, ordered=False).modified_count
+
+    for model, count in repaired.items():
+        if count:
+            versions.bump(model)
+    return repaired
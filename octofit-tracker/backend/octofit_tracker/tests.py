@@ -1,9 +1,31 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from bson import ObjectId
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from rest_framework.test import APITestCase
 from rest_framework import status
-from django.urls import reverse
-from datetime import datetime
-from .models import User, Team, Activity, Leaderboard, Workout
+from django.urls import resolve, reverse
+from datetime import datetime, timedelta
+from . import (
+    activity_filters, activity_repository, async_views, leaderboard, leaderboard_cache, leaderboard_periods, live,
+    metrics, pool, slowops, team_leaderboard, versions,
+)
+from .handlers import ASGIHandler
+from .models import User, Team, Activity, ActivityRollup, Leaderboard, LeaderboardPeriod, TeamLeaderboard, Workout
+from .serializers import ActivitySerializer
+from .monitoring import record_commands
+from .mongo import get_collection
 
 
 class UserModelTest(TestCase):
@@ -183,3 +205,1231 @@ class APIRootTest(APITestCase):
         self.assertIn('activities', response.data)
         self.assertIn('leaderboard', response.data)
         self.assertIn('workouts', response.data)
+
+
+class LeaderboardMaintenanceTest(APITestCase):
+    """Test cases for incremental leaderboard updates on activity writes"""
+
+    def setUp(self):
+        self.team = Team.objects.create(name="Test Team", description="A test team")
+        self.alice = User.objects.create(
+            username="alice", email="alice@example.com", first_name="Alice",
+            last_name="Smith", password="password123", team_id=str(self.team._id)
+        )
+        self.bob = User.objects.create(
+            username="bob", email="bob@example.com", first_name="Bob",
+            last_name="Jones", password="password123", team_id=str(self.team._id)
+        )
+
+    def post_activity(self, user, calories, distance=1.0):
+        return self.client.post(reverse('activity-list'), {
+            'user_id': str(user._id),
+            'activity_type': 'Running',
+            'duration': 30,
+            'calories': calories,
+            'distance': distance,
+            'date': '2024-01-01T10:00:00Z',
+        }, format='json')
+
+    def test_create_updates_totals_and_profile(self):
+        """Test that creating activities increments the user's entry"""
+        self.post_activity(self.alice, 300, 5.0)
+        self.post_activity(self.alice, 200, 2.5)
+        entry = Leaderboard.objects.get(user_id=str(self.alice._id))
+        self.assertEqual(entry.total_calories, 500)
+        self.assertEqual(entry.total_activities, 2)
+        self.assertAlmostEqual(entry.total_distance, 7.5)
+        self.assertEqual(entry.user_name, "Alice Smith")
+        self.assertEqual(entry.team_name, "Test Team")
+        self.assertEqual(entry.rank, 1)
+
+    def test_ranks_move_when_scores_cross(self):
+        """Test that overtaking another user swaps their ranks"""
+        self.post_activity(self.alice, 300)
+        response = self.post_activity(self.bob, 200)
+        self.assertEqual(Leaderboard.objects.get(user_id=str(self.bob._id)).rank, 2)
+
+        self.client.patch(
+            reverse('activity-detail', args=[response.data['_id']]), {'calories': 400}, format='json'
+        )
+        self.assertEqual(Leaderboard.objects.get(user_id=str(self.bob._id)).rank, 1)
+        self.assertEqual(Leaderboard.objects.get(user_id=str(self.alice._id)).rank, 2)
+
+        self.client.delete(reverse('activity-detail', args=[response.data['_id']]))
+        bob = Leaderboard.objects.get(user_id=str(self.bob._id))
+        self.assertEqual(bob.total_calories, 0)
+        self.assertEqual(bob.total_activities, 0)
+        self.assertEqual(bob.rank, 2)
+        self.assertEqual(Leaderboard.objects.get(user_id=str(self.alice._id)).rank, 1)
+
+    def test_rising_score_shares_rank_with_ties(self):
+        """Test that catching up with another user's score shares their rank"""
+        self.post_activity(self.alice, 100)
+        response = self.post_activity(self.bob, 50)
+        self.client.patch(
+            reverse('activity-detail', args=[response.data['_id']]), {'calories': 100}, format='json'
+        )
+        self.assertEqual(Leaderboard.objects.get(user_id=str(self.bob._id)).rank, 1)
+        self.assertEqual(Leaderboard.objects.get(user_id=str(self.alice._id)).rank, 1)
+
+
+class UserTeamNameQueryTest(APITestCase):
+    """Test cases for reading team names on the user list"""
+
+    def setUp(self):
+        teams = [
+            Team.objects.create(name=f"Team {index}", description="A test team")
+            for index in range(3)
+        ]
+        for index in range(12):
+            User.objects.create(
+                username=f"user{index}", email=f"user{index}@example.com",
+                first_name="Test", last_name=f"User {index}", password="password123",
+                team_id=str(teams[index % 3]._id)
+            )
+
+    def test_user_list_reads_stored_team_names(self):
+        """Test that listing users reads team names without a second query"""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 12)
+        self.assertTrue(all(user['team_name'].startswith("Team ") for user in response.data))
+
+
+class TeamNameDenormalizationTest(APITestCase):
+    """Test cases for the team names copied onto users and leaderboard entries"""
+
+    def setUp(self):
+        self.team = Team.objects.create(name="Falcons", description="A test team")
+        self.user = User.objects.create(
+            username="alice", email="alice@example.com", first_name="Alice",
+            last_name="Smith", password="password123", team_id=str(self.team._id)
+        )
+        self.client.post(reverse('activity-list'), {
+            'user_id': str(self.user._id), 'activity_type': 'Running', 'duration': 30,
+            'calories': 300, 'date': '2024-01-01T10:00:00Z',
+        }, format='json')
+
+    def test_user_save_copies_team_name(self):
+        """Test that saving a user stores its team's name and moves its leaderboard entry"""
+        self.assertEqual(User.objects.get(pk=self.user.pk).team_name, "Falcons")
+        other = Team.objects.create(name="Orcas", description="Another team")
+        self.client.patch(
+            reverse('user-detail', args=[str(self.user._id)]), {'team_id': str(other._id)}, format='json'
+        )
+        self.assertEqual(User.objects.get(pk=self.user.pk).team_name, "Orcas")
+        entry = Leaderboard.objects.get(user_id=str(self.user._id))
+        self.assertEqual((entry.team_id, entry.team_name), (str(other._id), "Orcas"))
+
+    def test_rename_and_delete_fan_out(self):
+        """Test that renaming or deleting a team rewrites every copy of its name"""
+        self.team.name = "Harriers"
+        self.team.save()
+        self.assertEqual(User.objects.get(pk=self.user.pk).team_name, "Harriers")
+        self.assertEqual(Leaderboard.objects.get(user_id=str(self.user._id)).team_name, "Harriers")
+
+        self.team.delete()
+        self.assertIsNone(User.objects.get(pk=self.user.pk).team_name)
+        self.assertEqual(Leaderboard.objects.get(user_id=str(self.user._id)).team_name, "")
+
+    def test_repair_fixes_drift(self):
+        """Test that the repair command rewrites copies changed behind the ORM's back"""
+        get_collection(User).update_one({'_id': self.user._id}, {'$set': {'team_name': "Stale"}})
+        get_collection(Leaderboard).update_one(
+            {'user_id': str(self.user._id)}, {'$set': {'team_id': '', 'team_name': "Stale"}}
+        )
+        out = StringIO()
+        call_command('repair_team_names', stdout=out)
+        self.assertIn('users: 1 documents repaired', out.getvalue())
+        self.assertEqual(User.objects.get(pk=self.user.pk).team_name, "Falcons")
+        entry = Leaderboard.objects.get(user_id=str(self.user._id))
+        self.assertEqual((entry.team_id, entry.team_name), (str(self.team._id), "Falcons"))
+
+
+class KeysetPaginationTest(APITestCase):
+    """Test cases for cursor pagination on activities and the leaderboard"""
+
+    def setUp(self):
+        for rank in range(1, 6):
+            Leaderboard.objects.create(
+                user_id=f"user{rank}", user_name=f"User {rank}", team_id="team123",
+                team_name="Test Team", total_calories=1000 - rank, rank=rank
+            )
+
+    def test_leaderboard_pages_follow_rank(self):
+        """Test that following next links walks the leaderboard in rank order"""
+        url = reverse('leaderboard-list') + '?page_size=2'
+        ranks = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ranks.extend(entry['rank'] for entry in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ranks, [1, 2, 3, 4, 5])
+
+    def test_previous_link_returns_prior_page(self):
+        """Test that the previous link on page two returns page one"""
+        first = self.client.get(reverse('leaderboard-list') + '?page_size=2')
+        second = self.client.get(first.data['next'])
+        self.assertIsNotNone(second.data['previous'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [entry['rank'] for entry in back.data['results']],
+            [entry['rank'] for entry in first.data['results']]
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        """Test that a garbled cursor is rejected"""
+        response = self.client.get(reverse('activity-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ActivityBulkAPITest(APITestCase):
+    """Test cases for bulk activity ingestion"""
+
+    def row(self, calories):
+        return {
+            'user_id': 'user123',
+            'activity_type': 'Cycling',
+            'duration': 40,
+            'calories': calories,
+            'distance': 12.5,
+            'date': '2024-01-01T10:00:00Z',
+        }
+
+    def test_bulk_json_reports_row_errors(self):
+        """Test that invalid rows are reported without failing the batch"""
+        rows = [self.row(300), {'user_id': 'user123'}, self.row(200)]
+        response = self.client.post(reverse('activity-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertEqual(Activity.objects.filter(user_id='user123').count(), 2)
+        entry = Leaderboard.objects.get(user_id='user123')
+        self.assertEqual(entry.total_calories, 500)
+        self.assertEqual(entry.total_activities, 2)
+
+    def test_bulk_ndjson(self):
+        """Test that an NDJSON body is ingested line by line"""
+        body = '\n'.join(json.dumps(self.row(calories)) for calories in (100, 150, 250)) + '\n'
+        response = self.client.post(
+            reverse('activity-bulk'), data=body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(Leaderboard.objects.get(user_id='user123').total_calories, 500)
+
+
+class StatsAPITest(APITestCase):
+    """Test cases for the aggregation-backed stats endpoints"""
+
+    def setUp(self):
+        for day, activity_type, calories in ((1, 'Running', 300), (1, 'Yoga', 100), (2, 'Running', 200)):
+            Activity.objects.create(
+                user_id="user123", activity_type=activity_type, duration=30,
+                calories=calories, distance=5.0, date=datetime(2024, 1, day, 8, 0)
+            )
+
+    def test_user_totals(self):
+        """Test that totals per user are summed in the database"""
+        response = self.client.get(reverse('stats-users'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['user_id'], "user123")
+        self.assertEqual(response.data[0]['total_calories'], 600)
+        self.assertEqual(response.data[0]['activity_count'], 3)
+
+    def test_activity_type_daily_buckets(self):
+        """Test that activity types are bucketed per day within the range"""
+        response = self.client.get(
+            reverse('stats-activity-types') + '?period=day&start=2024-01-01&end=2024-01-01'
+        )
+        self.assertEqual(
+            [(row['period'], row['activity_type'], row['total_calories']) for row in response.data],
+            [('2024-01-01', 'Running', 300), ('2024-01-01', 'Yoga', 100)]
+        )
+
+    def test_invalid_period(self):
+        """Test that an unknown period is rejected"""
+        response = self.client.get(reverse('stats-users') + '?period=decade')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IndexAuditTest(TestCase):
+    """Test cases for the index audit command helpers"""
+
+    def test_plan_stages_ignores_rejected_plans(self):
+        """Test that only winning-plan stages are reported"""
+        from .management.commands.audit_indexes import plan_stages
+        explanation = {'queryPlanner': {
+            'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}},
+            'rejectedPlans': [{'stage': 'COLLSCAN'}],
+        }}
+        self.assertEqual(plan_stages(explanation), ['FETCH', 'IXSCAN'])
+
+    def test_declared_indexes(self):
+        """Test that the hot query shapes have declared indexes"""
+        self.assertIn(['user_id', 'date'], [index.fields for index in Activity._meta.indexes])
+        self.assertIn(['rank', '_id'], [index.fields for index in Leaderboard._meta.indexes])
+        self.assertIn(['team_id'], [index.fields for index in User._meta.indexes])
+
+
+class PopulateSyntheticTest(TestCase):
+    """Test cases for the synthetic data mode of populate_db"""
+
+    def populate(self, chunk_size=8):
+        call_command(
+            'populate_db', users=20, teams=3, activities_per_user=4, days=30,
+            seed=7, end_date='2024-06-30', workers=1, chunk_size=chunk_size, stdout=StringIO()
+        )
+
+    def test_synthetic_rows_and_leaderboard(self):
+        """Test that synthetic mode writes the requested rows and ranks them"""
+        self.populate()
+        self.assertEqual(Team.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Activity.objects.count(), 80)
+        self.assertEqual(Leaderboard.objects.count(), 20)
+        top = Leaderboard.objects.order_by('rank').first()
+        self.assertEqual(top.rank, 1)
+        self.assertEqual(top.total_activities, 4)
+
+    def test_synthetic_rows_are_deterministic(self):
+        """Test that the same seed reproduces the same activities"""
+        self.populate()
+        first = list(Activity.objects.order_by('_id').values_list('calories', flat=True))
+        self.populate()
+        second = list(Activity.objects.order_by('_id').values_list('calories', flat=True))
+        self.assertEqual(first, second)
+
+    def test_chunk_size_does_not_change_rows(self):
+        """Test that rows depend on the seed and their index, not on how they are chunked"""
+        fields = ('_id', 'user_id', 'activity_type', 'duration', 'calories', 'distance', 'date', 'notes')
+        self.populate(chunk_size=8)
+        users = list(User.objects.order_by('_id').values_list('_id', 'first_name', 'last_name', 'date_joined'))
+        activities = list(Activity.objects.order_by('_id').values_list(*fields))
+        self.populate(chunk_size=3)
+        self.assertEqual(
+            list(User.objects.order_by('_id').values_list('_id', 'first_name', 'last_name', 'date_joined')), users
+        )
+        self.assertEqual(list(Activity.objects.order_by('_id').values_list(*fields)), activities)
+
+
+class BenchmarkHelpersTest(TestCase):
+    """Test cases for the benchmark command helpers"""
+
+    def test_nearest_rank_percentiles(self):
+        """Test that percentiles use the nearest-rank method"""
+        from .management.commands.benchmark import percentile
+        latencies = list(range(1, 101))
+        self.assertEqual(percentile(latencies, 50), 50)
+        self.assertEqual(percentile(latencies, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+
+class FastReadPathTest(APITestCase):
+    """Test cases for the projected-row read path"""
+
+    def setUp(self):
+        team = Team.objects.create(name="Test Team", description="A test team")
+        user = User.objects.create(
+            username="fast", email="fast@example.com", first_name="Fast", last_name="Reader",
+            password="password123", team_id=str(team._id)
+        )
+        Activity.objects.create(
+            user_id=str(user._id), activity_type="Running", duration=30, calories=300,
+            distance=5.5, date=datetime(2024, 1, 1, 7, 30, 15, 250000), notes="Morning run"
+        )
+        Leaderboard.objects.create(
+            user_id=str(user._id), user_name="Fast Reader", team_id=str(team._id),
+            team_name="Test Team", total_calories=300, total_activities=1, total_distance=5.5, rank=1
+        )
+        Workout.objects.create(
+            name="Test Workout", description="A test workout", activity_type="strength",
+            difficulty="intermediate", duration=45, calories=400, instructions="Do the exercises"
+        )
+
+    def test_fast_path_matches_serializer_output(self):
+        """Test that list and retrieve responses are byte-identical on both paths"""
+        for basename in ('user', 'team', 'activity', 'leaderboard', 'workout'):
+            with override_settings(OCTOFIT_FAST_READS=False):
+                slow = self.client.get(reverse(f'{basename}-list'), HTTP_ACCEPT='application/json')
+            with override_settings(OCTOFIT_FAST_READS=True):
+                fast = self.client.get(reverse(f'{basename}-list'), HTTP_ACCEPT='application/json')
+            self.assertEqual(fast.content, slow.content, basename)
+
+            data = slow.json()
+            object_id = (data['results'] if isinstance(data, dict) else data)[0]['_id']
+            url = reverse(f'{basename}-detail', args=[object_id])
+            with override_settings(OCTOFIT_FAST_READS=False):
+                slow = self.client.get(url, HTTP_ACCEPT='application/json')
+            with override_settings(OCTOFIT_FAST_READS=True):
+                fast = self.client.get(url, HTTP_ACCEPT='application/json')
+            self.assertEqual(fast.content, slow.content, basename)
+
+
+class ConditionalGetTest(APITestCase):
+    """Test cases for ETag and Last-Modified handling"""
+
+    def setUp(self):
+        Workout.objects.create(
+            name="Test Workout", description="A test workout", activity_type="strength",
+            difficulty="intermediate", duration=45, calories=400, instructions="Do the exercises"
+        )
+
+    def test_matching_etag_skips_query(self):
+        """Test that a current ETag gets a 304 without querying the collection"""
+        url = reverse('workout-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_write_changes_etag(self):
+        """Test that a write to the collection invalidates the ETag"""
+        url = reverse('workout-list')
+        etag = self.client.get(url)['ETag']
+        Workout.objects.create(
+            name="Another Workout", description="Another test workout", activity_type="cardio",
+            difficulty="beginner", duration=20, calories=150, instructions="Keep moving"
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class LeaderboardTopCacheTest(APITestCase):
+    """Test cases for the cached top-N leaderboard"""
+
+    def setUp(self):
+        caches['leaderboard'].clear()
+        for index, (team_id, calories) in enumerate([('red', 900), ('blue', 700), ('red', 500)]):
+            Leaderboard.objects.create(
+                user_id=f"user{index}", user_name=f"User {index}", team_id=team_id,
+                team_name=team_id.title(), total_calories=calories, total_activities=1,
+                total_distance=1.0, rank=index + 1
+            )
+
+    def test_top_overall_and_per_team(self):
+        """Test that top returns the leading entries overall and per team"""
+        response = self.client.get(reverse('leaderboard-top'), {'n': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry['user_id'] for entry in response.json()], ['user0', 'user1'])
+        response = self.client.get(reverse('leaderboard-top'), {'team_id': 'red'})
+        self.assertEqual([entry['user_id'] for entry in response.json()], ['user0', 'user2'])
+
+    def test_hit_skips_query_and_write_invalidates(self):
+        """Test that repeated reads hit the cache until the leaderboard changes"""
+        url = reverse('leaderboard-top')
+        self.client.get(url)
+        hits = metrics.counter('leaderboard_cache.hits')
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.assertEqual(metrics.counter('leaderboard_cache.hits'), hits + 1)
+
+        Leaderboard.objects.filter(user_id='user2').update(total_calories=1000, rank=0)
+        versions.bump(Leaderboard)
+        response = self.client.get(url)
+        self.assertEqual(response.json()[0]['user_id'], 'user2')
+
+    def test_invalid_n(self):
+        """Test that n outside the allowed range is rejected"""
+        response = self.client.get(reverse('leaderboard-top'), {'n': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_metrics_endpoint(self):
+        """Test that cache metrics are exposed"""
+        self.client.get(reverse('leaderboard-top'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertIn('leaderboard_cache.rebuild', data['timings'])
+        self.assertIn('leaderboard_cache.hit_rate', data['gauges'])
+
+
+class SparseFieldsTest(APITestCase):
+    """Test cases for ?fields= and ?exclude="""
+
+    def setUp(self):
+        team = Team.objects.create(name="Test Team", description="A test team")
+        self.user = User.objects.create(
+            username="sparse", email="sparse@example.com", first_name="Sparse", last_name="Fields",
+            password="password123", team_id=str(team._id)
+        )
+        Activity.objects.create(
+            user_id=str(self.user._id), activity_type="Running", duration=30, calories=300,
+            distance=5.5, date=datetime(2024, 1, 1, 7, 30), notes="A long note"
+        )
+
+    def get(self, basename, params, fast=True):
+        with override_settings(OCTOFIT_FAST_READS=fast):
+            return self.client.get(reverse(f'{basename}-list'), params, HTTP_ACCEPT='application/json')
+
+    def test_fields_and_exclude_on_both_paths(self):
+        """Test that only the requested fields are returned"""
+        for fast in (True, False):
+            response = self.get('activity', {'fields': 'user_id,calories'}, fast)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(set(response.json()['results'][0]), {'user_id', 'calories'})
+
+            response = self.get('activity', {'exclude': 'notes'}, fast)
+            self.assertNotIn('notes', response.json()['results'][0])
+
+            response = self.get('user', {'fields': 'username,team_name'}, fast)
+            self.assertEqual(response.json(), [{'username': 'sparse', 'team_name': 'Test Team'}])
+
+    def test_projection_excludes_unrequested_fields(self):
+        """Test that unrequested fields are left out of the Mongo query"""
+        with record_commands(keep_commands=True) as recorder:
+            self.get('activity', {'fields': 'calories'})
+        finds = [record['command'] for record in recorder.commands if record['name'] == 'find']
+        self.assertTrue(finds)
+        self.assertNotIn('notes', str(finds))
+
+    def test_unknown_field_rejected(self):
+        """Test that unknown field names return a 400"""
+        response = self.get('activity', {'fields': 'calories,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.json())
+
+
+class AsyncReadPathTest(TestCase):
+    """Test cases for the motor-backed async list and retrieve views"""
+
+    def setUp(self):
+        team = Team.objects.create(name="Test Team", description="A test team")
+        self.user = User.objects.create(
+            username="async", email="async@example.com", first_name="Async", last_name="Reader",
+            password="password123", team_id=str(team._id)
+        )
+        for day in range(1, 4):
+            Activity.objects.create(
+                user_id=str(self.user._id), activity_type="Running", duration=30, calories=100 * day,
+                distance=5.0, date=datetime(2024, 1, day, 7, 30), notes="Morning run"
+            )
+
+    def compare(self, path):
+        request = RequestFactory().get(path, HTTP_ACCEPT='application/json')
+        match = resolve(request.path_info)
+        response = async_to_sync(async_views.read)(match.func, request, match.args, match.kwargs)
+        self.assertIsNotNone(response, path)
+        expected = match.func(RequestFactory().get(path, HTTP_ACCEPT='application/json'), *match.args, **match.kwargs)
+        expected.render()
+        self.assertEqual(response.content, expected.content, path)
+        self.assertEqual(response['ETag'], expected['ETag'], path)
+        return response
+
+    def test_matches_sync_views(self):
+        """Test that async list and retrieve render the same bytes as the sync views"""
+        for basename in ('user', 'team', 'activity', 'leaderboard', 'workout'):
+            self.compare(reverse(f'{basename}-list'))
+        self.compare(reverse('user-detail', args=[str(self.user._id)]))
+        self.compare(f"{reverse('user-list')}?fields=username,team_name")
+
+    def test_cursor_pages_match(self):
+        """Test that keyset cursors work the same on the async path"""
+        response = self.compare(f"{reverse('activity-list')}?page_size=2")
+        self.compare(json.loads(response.content)['next'].replace('http://testserver', ''))
+
+    def test_unsupported_requests_fall_back(self):
+        """Test that browsable and unknown-parameter requests go to the sync view"""
+        for path, accept in ((reverse('activity-list'), 'text/html'),
+                             (f"{reverse('activity-list')}?unknown=1", 'application/json')):
+            request = RequestFactory().get(path, HTTP_ACCEPT=accept)
+            match = resolve(request.path_info)
+            self.assertIsNone(async_views.prepare(match.func, request, match.args, match.kwargs))
+
+
+class LiveLeaderboardTest(TestCase):
+    """Test cases for the leaderboard event stream"""
+
+    def test_diff(self):
+        """Test that only changed and departed entries are reported"""
+        sent = {'a': {'user_id': 'a', 'rank': 1}, 'b': {'user_id': 'b', 'rank': 2}}
+        entries = [{'user_id': 'b', 'rank': 1}, {'user_id': 'c', 'rank': 2}]
+        changed, removed = live.diff(sent, entries)
+        self.assertEqual(changed, entries)
+        self.assertEqual(removed, ['a'])
+        self.assertEqual(live.diff({'b': entries[0], 'c': entries[1]}, entries), ([], []))
+
+    def test_stream_outside_asgi(self):
+        """Test that the stream path explains itself instead of reaching the leaderboard detail route"""
+        self.assertEqual(reverse('leaderboard-stream'), live.STREAM_PATH)
+        response = self.client.get(live.STREAM_PATH)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('ASGI', response.json()['detail'])
+        self.assertEqual(self.client.post(live.STREAM_PATH).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @override_settings(OCTOFIT_LIVE_WINDOW=0.05)
+    def test_stream_pushes_rank_delta(self):
+        """Test that a write that moves ranks is pushed to a connected client"""
+        Leaderboard.objects.create(
+            user_id="user1", user_name="User One", team_id="team", team_name="Team",
+            total_calories=100, total_activities=1, total_distance=1.0, rank=1
+        )
+
+        async def run():
+            incoming, bodies = asyncio.Queue(), asyncio.Queue()
+
+            async def send(message):
+                if message['type'] == 'http.response.body':
+                    await bodies.put(message['body'])
+
+            scope = {'type': 'http', 'method': 'GET', 'path': live.STREAM_PATH, 'query_string': b'', 'headers': []}
+            task = asyncio.ensure_future(live.stream(scope, incoming.get, send))
+            snapshot = await asyncio.wait_for(bodies.get(), 5)
+            for calories in (300, 50):
+                await sync_to_async(leaderboard.apply_deltas)({
+                    'user2': {'total_calories': calories, 'total_activities': 1, 'total_distance': 0.0},
+                })
+            delta = await asyncio.wait_for(bodies.get(), 5)
+            await incoming.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(task, 5)
+            return snapshot, delta
+
+        snapshot, delta = async_to_sync(run)()
+        self.assertTrue(snapshot.startswith(b'event: snapshot\n'))
+        self.assertTrue(delta.startswith(b'event: delta\n'))
+        data = json.loads(delta.split(b'data: ', 1)[1])
+        ranks = {entry['user_id']: entry['rank'] for entry in data['changed']}
+        self.assertEqual(ranks, {'user2': 1, 'user1': 2})
+        self.assertEqual(data['removed'], [])
+
+    def test_failed_stream_unsubscribes(self):
+        """Test that a stream failing before its first frame releases its channel"""
+        async def run():
+            async def send(message):
+                raise OSError('client went away')
+
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': live.STREAM_PATH,
+                'query_string': b'team_id=gone', 'headers': [],
+            }
+            with self.assertRaises(OSError):
+                await live.stream(scope, asyncio.Queue().get, send)
+            return dict(live.get_broadcaster().channels)
+
+        self.assertNotIn('gone', async_to_sync(run)())
+
+
+class ActivityRollupTest(APITestCase):
+    """Test cases for the daily per-user activity rollups"""
+
+    def setUp(self):
+        self.user_id = str(User.objects.create(
+            username="roll", email="roll@example.com", first_name="Roll", last_name="Up",
+            password="password123"
+        )._id)
+
+    def post_activity(self, date, calories, activity_type='Running'):
+        return self.client.post(reverse('activity-list'), {
+            'user_id': self.user_id, 'activity_type': activity_type, 'duration': 30,
+            'calories': calories, 'distance': 2.0, 'date': date,
+        }, format='json')
+
+    def rollups(self):
+        return {
+            (rollup.day.strftime('%Y-%m-%d'), rollup.activity_type): (rollup.total_calories, rollup.activity_count)
+            for rollup in ActivityRollup.objects.filter(user_id=self.user_id)
+        }
+
+    def test_writes_update_rollups(self):
+        """Test that creates, updates and deletes keep the rollups in step"""
+        self.post_activity('2024-03-01T08:00:00Z', 100)
+        self.post_activity('2024-03-01T23:30:00Z', 200)
+        response = self.post_activity('2024-03-02T08:00:00Z', 50, 'Yoga')
+        self.assertEqual(self.rollups(), {
+            ('2024-03-01', 'Running'): (300, 2),
+            ('2024-03-02', 'Yoga'): (50, 1),
+        })
+
+        url = reverse('activity-detail', args=[response.data['_id']])
+        self.client.patch(url, {'date': '2024-03-01T12:00:00Z'}, format='json')
+        self.assertEqual(self.rollups(), {
+            ('2024-03-01', 'Running'): (300, 2),
+            ('2024-03-01', 'Yoga'): (50, 1),
+        })
+
+        self.client.delete(url)
+        self.assertEqual(self.rollups(), {('2024-03-01', 'Running'): (300, 2)})
+
+    def test_rebuild_matches_incremental(self):
+        """Test that the rebuild command reproduces the incremental rollups"""
+        self.post_activity('2024-03-01T08:00:00Z', 100)
+        self.post_activity('2024-03-03T08:00:00Z', 250, 'Cycling')
+        incremental = self.rollups()
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_daily_endpoint(self):
+        """Test that the range endpoint reads the rollups for one user"""
+        self.post_activity('2024-03-01T08:00:00Z', 100)
+        self.post_activity('2024-03-09T08:00:00Z', 200)
+        url = reverse('stats-daily')
+        response = self.client.get(url, {'user_id': self.user_id, 'start': '2024-03-01', 'end': '2024-03-05'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['day'] for row in response.data], ['2024-03-01'])
+
+        response = self.client.get(url, {'user_id': self.user_id, 'period': 'month'})
+        self.assertEqual(response.data[0]['period'], '2024-03')
+        self.assertEqual(response.data[0]['total_calories'], 300)
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityExportTest(APITestCase):
+    """Test cases for the streaming activity export"""
+
+    def setUp(self):
+        team = Team.objects.create(name="Export Team", description="A test team")
+        self.member = User.objects.create(
+            username="member", email="member@example.com", first_name="Team", last_name="Member",
+            password="password123", team_id=str(team._id)
+        )
+        self.team_id = str(team._id)
+        loner = User.objects.create(
+            username="loner", email="loner@example.com", first_name="Solo", last_name="Runner",
+            password="password123"
+        )
+        for user, day in ((self.member, 1), (self.member, 5), (loner, 2)):
+            Activity.objects.create(
+                user_id=str(user._id), activity_type="Running", duration=30, calories=100 * day,
+                distance=2.0, date=datetime(2024, 1, day, 8, 0), notes="Line one, with a comma"
+            )
+
+    def export(self, fmt, **params):
+        response = self.client.get(reverse('activity-export'), dict(params, format=fmt))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export(self):
+        """Test that CSV is streamed with a header row, oldest first"""
+        response, content = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(content.decode())))
+        self.assertEqual([row['calories'] for row in rows], ['100', '200', '500'])
+        self.assertEqual(rows[0]['notes'], "Line one, with a comma")
+
+    def test_ndjson_export_with_filters(self):
+        """Test that team and date filters narrow the NDJSON export"""
+        response, content = self.export('ndjson', team_id=self.team_id, start='2024-01-03')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['calories'] for row in rows], [500])
+        self.assertEqual(rows[0]['user_id'], str(self.member._id))
+
+    def test_gzip_export(self):
+        """Test that gzip=1 compresses the stream into a .gz download"""
+        response, content = self.export('ndjson', gzip='1', user_id=str(self.member._id))
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('activities.ndjson.gz', response['Content-Disposition'])
+        self.assertEqual(len(gzip.decompress(content).splitlines()), 2)
+
+    def test_asgi_stream_read_off_event_loop(self):
+        """Test that the ASGI handler reads streaming bodies outside the event loop thread"""
+        readers = []
+
+        def body():
+            for part in (b'first', b'second'):
+                readers.append(threading.get_ident())
+                yield part
+
+        async def run():
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            await ASGIHandler().send_response(StreamingHttpResponse(body()), send)
+            return threading.get_ident(), messages
+
+        loop_thread, messages = async_to_sync(run)()
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual([message.get('body', b'') for message in messages[1:]], [b'first', b'second', b''])
+        self.assertEqual(len(readers), 2)
+        self.assertNotIn(loop_thread, readers)
+
+
+class ImportActivitiesTest(TestCase):
+    """Test cases for the resumable import_activities command"""
+
+    def setUp(self):
+        self.user_id = str(User.objects.create(
+            username="importer", email="importer@example.com", first_name="Bulk", last_name="Loader",
+            password="password123"
+        )._id)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'activities.ndjson')
+        lines = [
+            json.dumps({'user_id': self.user_id, 'activity_type': 'Running', 'duration': 30,
+                        'calories': calories, 'date': '2024-01-01T08:00:00Z'})
+            for calories in (100, 200, 300)
+        ]
+        lines.insert(1, '{"user_id": "broken"')
+        with open(self.path, 'w') as handle:
+            handle.write('\n'.join(lines) + '\n')
+        self.first_line_length = len(lines[0]) + 1
+
+    def run_import(self, *args):
+        output = StringIO()
+        call_command('import_activities', self.path, '--chunk-size', '2', *args, stdout=output, stderr=StringIO())
+        return output.getvalue()
+
+    def test_import_and_leaderboard(self):
+        """Test that valid rows are imported and the leaderboard recomputed once"""
+        output = self.run_import()
+        self.assertIn('Imported 3 activities (0 already present, 1 rejected)', output)
+        self.assertEqual(Activity.objects.filter(user_id=self.user_id).count(), 3)
+        entry = Leaderboard.objects.get(user_id=self.user_id)
+        self.assertEqual((entry.total_calories, entry.total_activities, entry.rank), (600, 3, 1))
+        self.assertEqual(ActivityRollup.objects.get(user_id=self.user_id).activity_count, 3)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_resume_from_checkpoint(self):
+        """Test that a checkpoint skips rows already read and replays are not duplicated"""
+        self.run_import()
+        source = f'activities.ndjson:{os.path.getsize(self.path)}'
+        with open(f'{self.path}.checkpoint', 'w') as handle:
+            json.dump({'source': source, 'offset': self.first_line_length, 'rows': 1,
+                       'created': 1, 'duplicates': 0, 'failed': 0, 'users': [self.user_id]}, handle)
+        output = self.run_import()
+        self.assertIn('Imported 1 activities (2 already present, 1 rejected)', output)
+        self.assertEqual(Activity.objects.filter(user_id=self.user_id).count(), 3)
+        self.assertEqual(Leaderboard.objects.get(user_id=self.user_id).total_calories, 600)
+
+    def test_resume_recomputes_users_of_replayed_rows(self):
+        """Test that rows inserted before a crash still have their users recomputed"""
+        self.run_import()
+        Leaderboard.objects.filter(user_id=self.user_id).delete()
+        source = f'activities.ndjson:{os.path.getsize(self.path)}'
+        with open(f'{self.path}.checkpoint', 'w') as handle:
+            json.dump({'source': source, 'offset': 0, 'rows': 0,
+                       'created': 0, 'duplicates': 0, 'failed': 0, 'users': []}, handle)
+        self.run_import()
+        self.assertEqual(Leaderboard.objects.get(user_id=self.user_id).total_calories, 600)
+
+    def test_empty_file(self):
+        """Test that a file without rows imports nothing and leaves no checkpoint"""
+        with open(self.path, 'w'):
+            pass
+        self.assertIn('Imported 0 activities', self.run_import())
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+
+class PerformanceMiddlewareTest(APITestCase):
+    """Test cases for the sampled Server-Timing middleware"""
+
+    def setUp(self):
+        Team.objects.create(name="Test Team", description="A test team")
+
+    @override_settings(OCTOFIT_PERF_SAMPLE_RATE=1)
+    def test_sampled_request_reports_timings(self):
+        """Test that a sampled request gets a Server-Timing header and a log line"""
+        with self.assertLogs('octofit_tracker.performance', 'INFO') as logs:
+            response = self.client.get(reverse('team-list'), HTTP_ACCEPT='application/json')
+        names = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(names[0], 'mongo')
+        self.assertIn('serialize', names)
+        self.assertIn('render', names)
+        self.assertEqual(names[-1], 'total')
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['method'], entry['path'], entry['status']), ('GET', reverse('team-list'), 200))
+        self.assertGreater(entry['mongo_ops'], 0)
+        self.assertLessEqual(entry['mongo_ms'], entry['total_ms'])
+
+    @override_settings(OCTOFIT_PERF_SAMPLE_RATE=0)
+    def test_unsampled_request_untouched(self):
+        """Test that requests outside the sample get no Server-Timing header"""
+        response = self.client.get(reverse('team-list'), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+
+
+class SlowOperationLogTest(TestCase):
+    """Test cases for the slow Mongo operation log and the slowops command"""
+
+    @override_settings(OCTOFIT_SLOWOPS_THRESHOLD_MS=0)
+    def test_slow_query_logged_with_sql(self):
+        """Test that a command over the threshold is logged with the SQL behind it"""
+        Team.objects.create(name="Slow Team", description="A test team")
+        with self.assertLogs('octofit_tracker.slowops', 'WARNING') as logs:
+            list(Team.objects.filter(name="Slow Team"))
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        record = next(record for record in records if record['collection'] == 'teams')
+        self.assertIn('SELECT', record['sql'])
+        self.assertEqual(record['documents'], 1)
+        self.assertNotIn('Slow Team', json.dumps(record['shape']))
+
+    def test_records_grouped_by_shape(self):
+        """Test that records differing only in values are aggregated together"""
+        def record(name, duration, sql='SELECT "teams"."_id" FROM "teams" WHERE "teams"."name" = %(0)s LIMIT 21'):
+            command = {'find': 'teams', 'filter': {'name': name}, 'limit': 21, 'lsid': {'id': name}}
+            return json.dumps({
+                'sql': sql, 'command_name': 'find', 'collection': 'teams',
+                'shape': slowops.command_shape(command), 'duration_ms': duration, 'documents': 1,
+            })
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as handle:
+            handle.write('\n'.join([record('a', 150), record('b', 250), record('c', 900, sql=None)]) + '\n')
+        self.addCleanup(os.remove, handle.name)
+
+        output = StringIO()
+        call_command('slowops', handle.name, stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[1].split()[:4], ['1', '900.0', '900.0', '900.0'])
+        self.assertEqual(lines[3].split()[:4], ['2', '400.0', '200.0', '250.0'])
+        self.assertIn('LIMIT ?', output.getvalue())
+
+
+class ActivityRepositoryTest(APITestCase):
+    """Test cases comparing the pymongo activity repository with the ORM path"""
+
+    def setUp(self):
+        self.user_ids = []
+        for username in ("alice", "bob"):
+            self.user_ids.append(str(User.objects.create(
+                username=username, email=f"{username}@example.com", first_name=username.title(),
+                last_name="Tester", password="password123"
+            )._id))
+        for day in range(1, 6):
+            for position, user_id in enumerate(self.user_ids):
+                Activity.objects.create(
+                    user_id=user_id, activity_type="Running" if day % 2 else "Cycling",
+                    duration=20 + day, calories=100 * day + position, distance=None if day == 3 else day * 1.5,
+                    date=datetime(2024, 1, day, 7, 30, 15, 250000), notes=None if position else "Morning"
+                )
+
+    def get_both(self, url, params=None):
+        responses = []
+        for enabled in (False, True):
+            with override_settings(OCTOFIT_ACTIVITY_REPOSITORY=enabled):
+                responses.append(self.client.get(url, params, HTTP_ACCEPT='application/json'))
+        return responses
+
+    def test_list_pages_identical(self):
+        """Test that every page, with and without sparse fields, is byte-identical"""
+        for params in ({'page_size': 3}, {'page_size': 4, 'fields': 'user_id,calories'}):
+            url = reverse('activity-list')
+            while url:
+                orm, repository = self.get_both(url, params)
+                self.assertEqual(repository.status_code, status.HTTP_200_OK)
+                self.assertEqual(repository.content, orm.content)
+                url, params = orm.json()['next'], None
+
+    def test_retrieve_identical(self):
+        """Test that retrieve, including a missing id, matches the ORM path"""
+        activity = Activity.objects.first()
+        orm, repository = self.get_both(reverse('activity-detail', args=[str(activity._id)]))
+        self.assertEqual(repository.content, orm.content)
+
+        orm, repository = self.get_both(reverse('activity-detail', args=['0' * 24]))
+        self.assertEqual((orm.status_code, repository.status_code), (404, 404))
+
+    def test_find_matches_orm_filter(self):
+        """Test that repository filters return the rows the ORM returns"""
+        names = ['_id', 'user_id', 'activity_type', 'calories', 'date']
+        orm = Activity.objects.filter(user_id=self.user_ids[0], activity_type="Running").order_by('date').values(*names)
+        rows = activity_repository.find(
+            {'user_id': self.user_ids[0], 'activity_type': "Running"}, names, sort=[('date', 1)]
+        )
+        self.assertEqual(
+            ActivitySerializer.to_fast_representation(rows, names),
+            ActivitySerializer.to_fast_representation(list(orm), names),
+        )
+
+    def test_create_identical(self):
+        """Test that create returns the same body and updates the leaderboard"""
+        data = {'user_id': self.user_ids[1], 'activity_type': 'Swimming', 'duration': 40,
+                'calories': 350, 'date': '2024-02-01T06:00:00.123456Z'}
+        bodies = []
+        for enabled in (False, True):
+            with override_settings(OCTOFIT_ACTIVITY_REPOSITORY=enabled):
+                response = self.client.post(reverse('activity-list'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            body = response.json()
+            self.assertTrue(Activity.objects.filter(_id=ObjectId(body.pop('_id'))).exists())
+            bodies.append(body)
+        self.assertEqual(bodies[0], bodies[1])
+        entry = Leaderboard.objects.get(user_id=self.user_ids[1])
+        self.assertEqual((entry.total_activities, entry.total_calories), (2, 700))
+
+
+class MongoPoolTest(TestCase):
+    """Test cases for the process-wide Mongo client and its pool metrics"""
+
+    def test_client_survives_connection_close(self):
+        """Test that closing Django's connection keeps the pooled client"""
+        connection = connections['default']
+        connection.ensure_connection()
+        self.assertIs(connection.client_connection, pool.get_client())
+        connection.close()
+        self.assertEqual(Team.objects.count(), 0)
+        self.assertIs(connection.client_connection, pool.get_client())
+
+    def test_client_shared_across_aliases(self):
+        """Test that a connection under an alias missing from DATABASES gets the client of its settings"""
+        settings_dict = dict(connections['default'].settings_dict)
+        nodb = connections['default'].__class__(settings_dict, alias='__no_db__')
+        nodb.ensure_connection()
+        self.assertIs(nodb.client_connection, pool.get_client())
+        other = dict(settings_dict, CLIENT=dict(settings_dict['CLIENT'], appname='other'))
+        self.assertIsNot(pool.get_client(other), pool.get_client())
+
+    def test_connection_reopened_after_fork(self):
+        """Test that a connection inherited from another process is replaced"""
+        connection = connections['default']
+        connection.ensure_connection()
+        inherited = connection.connection
+        connection.pid = -1
+        connection.ensure_connection()
+        self.assertIsNot(connection.connection, inherited)
+        self.assertEqual(connection.pid, os.getpid())
+
+    def test_checkout_metrics(self):
+        """Test that checkouts are timed and in-use connections are counted"""
+        before = metrics.snapshot()['timings'].get('mongo_pool.checkout_wait', {}).get('count', 0)
+        Team.objects.count()
+        snapshot = metrics.snapshot()
+        self.assertGreater(snapshot['timings']['mongo_pool.checkout_wait']['count'], before)
+        self.assertGreaterEqual(snapshot['gauges']['mongo_pool.open_connections'], 1)
+        self.assertGreaterEqual(snapshot['gauges']['mongo_pool.peak_in_use'], 1)
+        self.assertIn('mongo_pool.in_use', snapshot['gauges'])
+
+    def test_warmup_primes_leaderboard_cache(self):
+        """Test that warmup fills the top-N cache and runs only once"""
+        caches[leaderboard_cache.CACHE_ALIAS].clear()
+        pool._state['warm'] = False
+        pool.warmup()
+        self.assertTrue(pool._state['warm'])
+        misses = metrics.counter('leaderboard_cache.misses')
+        version = versions.current([Leaderboard])[0][0]
+        leaderboard_cache.top(version, 10)
+        self.assertEqual(metrics.counter('leaderboard_cache.misses'), misses)
+
+
+class ActivityFilterTest(APITestCase):
+    """Test cases for index-backed activity list filters and ordering"""
+
+    def setUp(self):
+        self.team = Team.objects.create(name="Filter Team", description="A test team")
+        self.member = str(User.objects.create(
+            username="member", email="member@example.com", first_name="Team", last_name="Member",
+            password="password123", team_id=str(self.team._id)
+        )._id)
+        self.loner = str(User.objects.create(
+            username="loner", email="loner@example.com", first_name="No", last_name="Team",
+            password="password123"
+        )._id)
+        for day, (user_id, activity_type, duration, calories) in enumerate([
+            (self.member, "Running", 30, 300), (self.member, "Cycling", 60, 500),
+            (self.member, "Running", 15, 120), (self.loner, "Running", 45, 400),
+            (self.loner, "Yoga", 20, 90),
+        ], start=1):
+            Activity.objects.create(
+                user_id=user_id, activity_type=activity_type, duration=duration,
+                calories=calories, date=datetime(2024, 3, day, 8, 0)
+            )
+
+    def get(self, params, repository=False):
+        with override_settings(OCTOFIT_ACTIVITY_REPOSITORY=repository):
+            return self.client.get(reverse('activity-list'), params, HTTP_ACCEPT='application/json')
+
+    def calories(self, response):
+        return [activity['calories'] for activity in response.json()['results']]
+
+    def test_filters_on_both_paths(self):
+        """Test that each filter narrows the list identically on the ORM and repository paths"""
+        cases = [
+            ({'user_id': self.member}, [120, 500, 300]),
+            ({'team_id': str(self.team._id), 'activity_type': 'Running'}, [120, 300]),
+            ({'start': '2024-03-02', 'end': '2024-03-04'}, [400, 120, 500]),
+            ({'user_id': self.loner, 'min_duration': 30}, [400]),
+            ({'min_calories': 300, 'ordering': '-calories'}, [500, 400, 300]),
+            ({'user_id': self.member, 'ordering': 'calories'}, [120, 300, 500]),
+        ]
+        for params, expected in cases:
+            orm = self.get(params)
+            self.assertEqual(orm.status_code, status.HTTP_200_OK, params)
+            self.assertEqual(self.calories(orm), expected, params)
+            self.assertEqual(self.get(params, repository=True).content, orm.content, params)
+
+    def test_ordering_paginates(self):
+        """Test that a whitelisted ordering pages through every match in order"""
+        url, params, seen = reverse('activity-list'), {'ordering': '-calories', 'page_size': 2}, []
+        while url:
+            response = self.client.get(url, params, HTTP_ACCEPT='application/json')
+            seen.extend(self.calories(response))
+            url, params = response.json()['next'], None
+        self.assertEqual(seen, [500, 400, 300, 120, 90])
+
+        response = self.get({'ordering': 'notes'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response.json())
+
+    def test_unindexed_combinations(self):
+        """Test that unbounded filters are rejected and partially covered ones flagged"""
+        response = self.get({'min_duration': 30})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.get({'user_id': self.member, 'min_duration': 30})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Query-Index'], 'activity_user_date_id')
+        self.assertEqual(response['X-Unindexed-Filters'], 'duration')
+
+        index_names = {index.name for index in Activity._meta.indexes}
+        for params in ({}, {'activity_type': 'Yoga'}, {'team_id': 'x', 'ordering': 'calories'}):
+            index, residual = activity_filters.plan(activity_filters.parse(params))
+            self.assertIn(index, index_names)
+            self.assertEqual(residual, [])
+
+    def test_team_filter_validators_follow_users(self):
+        """Test that a user joining the team invalidates a team-filtered list"""
+        params = {'team_id': str(self.team._id), 'activity_type': 'Yoga'}
+        etag = self.get(params)['ETag']
+        self.client.patch(reverse('user-detail', args=[self.loner]), {'team_id': str(self.team._id)}, format='json')
+        response = self.client.get(
+            reverse('activity-list'), params, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.calories(response), [90])
+
+
+class TeamLeaderboardTest(APITestCase):
+    """Test cases for the incrementally maintained team leaderboard"""
+
+    def setUp(self):
+        self.falcons = Team.objects.create(name="Falcons", description="A test team")
+        self.orcas = Team.objects.create(name="Orcas", description="Another team")
+        self.users = {}
+        for username, team in (("alice", self.falcons), ("bob", self.falcons), ("carol", self.orcas)):
+            self.users[username] = User.objects.create(
+                username=username, email=f"{username}@example.com", first_name=username.title(),
+                last_name="Tester", password="password123", team_id=str(team._id)
+            )
+
+    def post_activity(self, username, calories, distance=2.0):
+        return self.client.post(reverse('activity-list'), {
+            'user_id': str(self.users[username]._id), 'activity_type': 'Running', 'duration': 30,
+            'calories': calories, 'distance': distance, 'date': '2024-01-01T10:00:00Z',
+        }, format='json')
+
+    def entries(self):
+        return {
+            entry['team_name']: entry
+            for entry in self.client.get(reverse('team-leaderboard-list'), HTTP_ACCEPT='application/json').json()
+        }
+
+    def test_activity_writes_update_team_totals(self):
+        """Test that activity writes update team totals, averages and ranks"""
+        self.post_activity("alice", 300)
+        self.post_activity("bob", 100)
+        response = self.post_activity("carol", 350)
+        falcons, orcas = self.entries()["Falcons"], self.entries()["Orcas"]
+        self.assertEqual(
+            (falcons['member_count'], falcons['total_calories'], falcons['total_activities'], falcons['rank']),
+            (2, 400, 2, 1)
+        )
+        self.assertEqual((falcons['average_calories'], falcons['average_distance']), (200.0, 2.0))
+        self.assertEqual(orcas['rank'], 2)
+
+        self.client.patch(reverse('activity-detail', args=[response.data['_id']]), {'calories': 500}, format='json')
+        entries = self.entries()
+        self.assertEqual((entries["Orcas"]['rank'], entries["Falcons"]['rank']), (1, 2))
+
+    def test_changing_team_moves_totals(self):
+        """Test that a user changing or leaving a team carries their totals and membership"""
+        self.post_activity("alice", 300)
+        self.post_activity("carol", 100)
+        self.client.patch(
+            reverse('user-detail', args=[str(self.users["alice"]._id)]), {'team_id': str(self.orcas._id)},
+            format='json'
+        )
+        entries = self.entries()
+        self.assertEqual((entries["Falcons"]['member_count'], entries["Falcons"]['total_calories']), (1, 0))
+        self.assertEqual((entries["Orcas"]['member_count'], entries["Orcas"]['total_calories']), (2, 400))
+        self.assertEqual(entries["Orcas"]['rank'], 1)
+
+        self.users["bob"].delete()
+        self.assertEqual(TeamLeaderboard.objects.get(team_id=str(self.falcons._id)).member_count, 0)
+
+    def test_rebuild_matches_incremental(self):
+        """Test that a full rebuild reproduces the incrementally maintained entries"""
+        for username, calories in (("alice", 200), ("bob", 150), ("carol", 400), ("alice", 50)):
+            self.post_activity(username, calories)
+        fields = ['team_id', 'team_name', 'member_count', 'total_calories', 'total_activities', 'total_distance', 'rank']
+        incremental = list(TeamLeaderboard.objects.order_by('team_id').values(*fields))
+        team_leaderboard.rebuild()
+        self.assertEqual(list(TeamLeaderboard.objects.order_by('team_id').values(*fields)), incremental)
+        self.assertEqual([entry['rank'] for entry in incremental], [1, 1])
+
+    def test_catching_up_shares_rank(self):
+        """Test that a team catching up with another's score shares its rank"""
+        self.post_activity("carol", 300)
+        self.post_activity("alice", 200)
+        self.post_activity("bob", 100)
+        entries = self.entries()
+        self.assertEqual((entries["Falcons"]['rank'], entries["Orcas"]['rank']), (1, 1))
+
+
+class LeaderboardWindowTest(APITestCase):
+    """Test cases for the time-windowed leaderboards"""
+
+    def setUp(self):
+        self.now = datetime.utcnow()
+        self.users = {}
+        for username in ("alice", "bob"):
+            self.users[username] = User.objects.create(
+                username=username, email=f"{username}@example.com", first_name=username.title(),
+                last_name="Tester", password="password123"
+            )
+        for username, calories, days_ago in (("alice", 300, 0), ("bob", 200, 1), ("bob", 400, 10)):
+            self.client.post(reverse('activity-list'), {
+                'user_id': str(self.users[username]._id), 'activity_type': 'Running', 'duration': 30,
+                'calories': calories, 'date': (self.now - timedelta(days=days_ago)).isoformat() + 'Z',
+            }, format='json')
+
+    def window(self, window, **params):
+        return self.client.get(reverse('leaderboard-window'), dict(params, window=window))
+
+    def test_rolling_windows_sum_day_buckets(self):
+        """Test that rolling windows rank only the activities inside them"""
+        recent = self.window('7d').data
+        self.assertEqual(
+            [(row['user_name'], row['total_calories'], row['rank']) for row in recent['results']],
+            [("Alice Tester", 300, 1), ("Bob Tester", 200, 2)]
+        )
+        self.assertEqual(recent['end'], self.now.date().isoformat())
+        longer = self.window('30d', n=1).data['results']
+        self.assertEqual([(row['user_name'], row['total_calories']) for row in longer], [("Bob Tester", 600)])
+
+    def test_invalid_window_rejected(self):
+        """Test that unknown windows and sizes are rejected"""
+        self.assertEqual(self.window('year').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.window('7d', n=0).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_and_expire(self):
+        """Test that a rebuild reproduces the buckets and expiry drops aged-out ones"""
+        fields = ['user_id', 'period', 'start', 'total_calories', 'total_activities']
+        incremental = list(LeaderboardPeriod.objects.order_by('user_id', 'period', 'start').values(*fields))
+        leaderboard_periods.rebuild()
+        rebuilt = list(LeaderboardPeriod.objects.order_by('user_id', 'period', 'start').values(*fields))
+        self.assertEqual(rebuilt, incremental)
+
+        out = StringIO()
+        call_command('expire_leaderboard_periods', stdout=out)
+        self.assertIn('day: 0 buckets deleted', out.getvalue())
+        deleted = leaderboard_periods.expire(now=self.now + timedelta(days=40))
+        self.assertEqual(deleted['day'], 3)
+        self.assertFalse(LeaderboardPeriod.objects.filter(period='day').exists())
+
+    def test_rebuild_rollups_rebuilds_buckets(self):
+        """Test that the rollup rebuild command also rebuilds the buckets built from them"""
+        incremental = self.window('30d').data['results']
+        LeaderboardPeriod.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.window('30d').data['results'], incremental)
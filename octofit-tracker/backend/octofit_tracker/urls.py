@@ -13,6 +13,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
@@ -20,12 +21,18 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 import os
+from . import live
+from .async_views import wrap_patterns
 from .views import (
     UserViewSet,
     TeamViewSet,
     ActivityViewSet,
     LeaderboardViewSet,
-    WorkoutViewSet
+    TeamLeaderboardViewSet,
+    WorkoutViewSet,
+    StatsViewSet,
+    leaderboard_stream_view,
+    metrics_view
 )
 
 
@@ -45,7 +52,10 @@ def api_root(request, format=None):
         'teams': reverse('team-list', request=request, format=format),
         'activities': reverse('activity-list', request=request, format=format),
         'leaderboard': reverse('leaderboard-list', request=request, format=format),
+        'team_leaderboard': reverse('team-leaderboard-list', request=request, format=format),
         'workouts': reverse('workout-list', request=request, format=format),
+        'stats': reverse('stats-list', request=request, format=format),
+        'metrics': reverse('metrics', request=request, format=format),
         'base_url': base_url
     })
 
@@ -55,11 +65,20 @@ router.register(r'users', UserViewSet)
 router.register(r'teams', TeamViewSet)
 router.register(r'activities', ActivityViewSet)
 router.register(r'leaderboard', LeaderboardViewSet)
+router.register(r'team-leaderboard', TeamLeaderboardViewSet, basename='team-leaderboard')
 router.register(r'workouts', WorkoutViewSet)
+router.register(r'stats', StatsViewSet, basename='stats')
+
+api_patterns = router.urls
+if settings.OCTOFIT_ASYNC_READS:
+    api_patterns = wrap_patterns(api_patterns)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', api_root, name='api-root'),
-    path('api/', include(router.urls)),
+    path('api/metrics/', metrics_view, name='metrics'),
+    # Served by the ASGI application; ahead of the router so it is not read as a leaderboard id
+    path(live.STREAM_PATH.lstrip('/'), leaderboard_stream_view, name='leaderboard-stream'),
+    path('api/', include(api_patterns)),
     path('', api_root, name='root'),
 ]
@@ -0,0 +1,48 @@
+"""Per-collection version counters backing conditional GETs.
+
+Every write bumps the counter of the collection it touched. Readers
+derive ETag and Last-Modified from the counters alone, so a client that
+already has the current representation can be answered without running
+the list query or the serializer.
+"""
+from datetime import datetime
+
+from .mongo import get_collection
+
+COLLECTION = 'collection_versions'
+
+
+def _name(model_or_name):
+    return model_or_name if isinstance(model_or_name, str) else model_or_name._meta.db_table
+
+
+def bump(*models_or_names):
+    """Record a write to each of the given collections"""
+    counters = get_collection(COLLECTION)
+    now = datetime.utcnow()
+    for model_or_name in models_or_names:
+        counters.update_one(
+            {'_id': _name(model_or_name)},
+            {'$inc': {'version': 1}, '$set': {'updated_at': now}},
+            upsert=True,
+        )
+
+
+def current(models_or_names):
+    """Return ``(versions, last_modified)`` for the given collections"""
+    names = [_name(model_or_name) for model_or_name in models_or_names]
+    return _summarize(names, get_collection(COLLECTION).find({'_id': {'$in': names}}))
+
+
+async def acurrent(models_or_names, database):
+    """``current`` read through a motor database"""
+    names = [_name(model_or_name) for model_or_name in models_or_names]
+    counters = await database[COLLECTION].find({'_id': {'$in': names}}).to_list(None)
+    return _summarize(names, counters)
+
+
+def _summarize(names, counters):
+    found = {counter['_id']: counter for counter in counters}
+    versions = tuple(found[name]['version'] if name in found else 0 for name in names)
+    timestamps = [counter['updated_at'] for counter in found.values() if counter.get('updated_at')]
+    return versions, max(timestamps) if timestamps else None
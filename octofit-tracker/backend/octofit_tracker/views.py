@@ -1,34 +1,433 @@
-from rest_framework import viewsets
-from .models import User, Team, Activity, Leaderboard, Workout
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status, viewsets
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from . import (
+    activity_filters, activity_repository, aggregates, export, leaderboard, leaderboard_cache, leaderboard_periods,
+    metrics, rollups, stats, versions,
+)
+from .ingest import ingest_activities, parse_ndjson
+from .models import User, Team, Activity, Leaderboard, TeamLeaderboard, Workout
+from .pagination import ActivityPagination, LeaderboardPagination
+from .renderers import CSVRenderer, NDJSONRenderer
 from .serializers import (
     UserSerializer,
     TeamSerializer,
     ActivitySerializer,
     LeaderboardSerializer,
+    TeamLeaderboardSerializer,
     WorkoutSerializer
 )
 
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+TOP_DEFAULT = 10
+
+
+class ConditionalGetMixin:
+    """
+    Answer list and retrieve requests with ETag and Last-Modified headers.
+
+    Validators come from the version counters of ``version_collections``
+    (the viewset's own collection by default), so a matching
+    ``If-None-Match`` or ``If-Modified-Since`` gets a 304 before the
+    queryset is touched.
+    """
+    version_collections = None
+
+    def get_version_collections(self):
+        return self.version_collections or (self.queryset.model,)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        # Validators are read before the data, so a concurrent write can
+        # only make the body newer than its ETag, never staler.
+        collection_versions, last_modified = versions.current(self.get_version_collections())
+        self.collection_versions = collection_versions
+        etag, last_modified = get_validators(request, collection_versions, last_modified)
+
+        if is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        return set_validators(response, etag, last_modified)
+
+
+def get_validators(request, collection_versions, last_modified):
+    """The ETag and Last-Modified timestamp for a versioned representation"""
+    validator = f'{collection_versions}|{request.get_full_path()}|{request.accepted_media_type}'
+    etag = f'"{hashlib.sha1(validator.encode()).hexdigest()}"'
+    return etag, timegm(last_modified.utctimetuple()) if last_modified else None
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        candidates = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+        return '*' in candidates or etag in candidates
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return bool(if_modified_since and last_modified and last_modified <= if_modified_since)
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+class SparseFieldsMixin:
+    """
+    Honour ``?fields=a,b`` and ``?exclude=c`` on list and retrieve.
 
-class UserViewSet(viewsets.ModelViewSet):
+    Unrequested fields are dropped from the serializer and from the Mongo
+    projection, so their bytes never leave the database. Fields the
+    paginator orders by are still fetched to build cursors.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = None
+            if self.action in self.sparse_actions:
+                params = self.request.query_params
+                self._requested_fields = self.get_serializer_class().select_fields(
+                    fields=_split_names(params.get('fields')),
+                    exclude=_split_names(params.get('exclude')),
+                )
+        return self._requested_fields
+
+    def get_projection(self):
+        """Model fields to fetch for the requested serializer fields"""
+        projection = self.get_serializer_class().get_sources(self.get_requested_fields())
+        for field in getattr(self.paginator, 'ordering', ()):
+            field = field.lstrip('-')
+            if field not in projection:
+                projection.append(field)
+        return projection
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.get_requested_fields() is not None:
+            queryset = queryset.only(*self.get_projection())
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_requested_fields() is not None:
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+def _split_names(value):
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class FastReadMixin(SparseFieldsMixin):
+    """
+    Serve JSON list and retrieve requests from ``.values()`` rows.
+
+    Skips building a model instance and a serializer per row; the output
+    is identical to the regular serializer path, which still handles
+    writes and the browsable API.
+    """
+
+    def use_fast_read(self, request):
+        return settings.OCTOFIT_FAST_READS and request.accepted_renderer.format == 'json'
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_read(request):
+            return super().list(request, *args, **kwargs)
+        serializer_class = self.get_serializer_class()
+        fields = self.get_requested_fields()
+        queryset = self.filter_queryset(self.get_queryset()).values(*self.get_projection())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer_class.to_fast_representation(page, fields))
+        return Response(serializer_class.to_fast_representation(list(queryset), fields))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_read(request):
+            return super().retrieve(request, *args, **kwargs)
+        serializer_class = self.get_serializer_class()
+        queryset = self.filter_queryset(self.get_queryset()).values(*self.get_projection())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return Response(serializer_class.to_fast_representation([row], self.get_requested_fields())[0])
+
+
+class UserViewSet(ConditionalGetMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(ConditionalGetMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
 
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityViewSet(ConditionalGetMixin, FastReadMixin, viewsets.ModelViewSet):
+    """
+    Activities, newest first.
+
+    The list takes ``user_id``, ``team_id``, ``activity_type``, ``start``,
+    ``end``, ``min_duration`` and ``min_calories`` filters and an
+    ``ordering`` of ``date`` or ``calories`` (``-`` for descending). Only
+    combinations an index can serve are accepted; see activity_filters.py.
+    """
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    pagination_class = ActivityPagination
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action == 'list':
+            self.list_filters = activity_filters.parse(request.query_params)
+            self.query_index, self.unindexed_filters = activity_filters.plan(self.list_filters)
+            self.paginator.ordering = activity_filters.keyset_ordering(self.list_filters['ordering'])
+            if self.unindexed_filters:
+                metrics.increment('activities.unindexed_filters')
+
+    def get_version_collections(self):
+        # A team filter is resolved through users, so a user changing team changes the result
+        if self.action == 'list' and self.request.query_params.get('team_id'):
+            return (Activity, User)
+        return super().get_version_collections()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            queryset = activity_filters.filter_queryset(queryset, self.list_filters)
+        return queryset
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'query_index', None):
+            response['X-Query-Index'] = self.query_index
+            if self.unindexed_filters:
+                response['X-Unindexed-Filters'] = ', '.join(self.unindexed_filters)
+        return response
 
-class LeaderboardViewSet(viewsets.ModelViewSet):
+    def use_repository(self, request):
+        """Whether JSON reads go through ``activity_repository`` instead of the ORM"""
+        return settings.OCTOFIT_ACTIVITY_REPOSITORY and self.use_fast_read(request)
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_repository(request):
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(request, self.repository_list)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_repository(request):
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(request, self.repository_retrieve)
+
+    def create(self, request, *args, **kwargs):
+        if not settings.OCTOFIT_ACTIVITY_REPOSITORY:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        row = activity_repository.create(serializer.validated_data)
+        return Response(self.get_serializer_class().to_fast_representation([row])[0], status=status.HTTP_201_CREATED)
+
+    def repository_list(self, request):
+        fields = self.get_requested_fields()
+        rows = activity_repository.paginate(
+            self.paginator, request, query=activity_filters.to_query(self.list_filters), names=self.get_projection()
+        )
+        return self.get_paginated_response(self.get_serializer_class().to_fast_representation(rows, fields))
+
+    def repository_retrieve(self, request):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = activity_repository.get(self.kwargs[lookup_url_kwarg], names=self.get_projection())
+        if row is None:
+            raise Http404
+        return Response(self.get_serializer_class().to_fast_representation([row], self.get_requested_fields())[0])
+
+    def perform_create(self, serializer):
+        activity = serializer.save()
+        aggregates.record_activities(added=[activity])
+
+    def perform_update(self, serializer):
+        previous = leaderboard.snapshot(serializer.instance)
+        activity = serializer.save()
+        aggregates.record_activities(added=[activity], removed=[previous])
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        aggregates.record_activities(removed=[instance])
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many activities from a JSON array or a streamed NDJSON body.
+        Invalid rows are reported by index and do not fail the batch.
+        """
+        if request.content_type.startswith(NDJSON_CONTENT_TYPES):
+            rows = parse_ndjson(request._request)
+        elif isinstance(request.data, list):
+            rows = enumerate(request.data)
+        else:
+            raise ValidationError({'non_field_errors': ['Expected a JSON array or an NDJSON body.']})
+
+        result = ingest_activities(rows)
+        response_status = status.HTTP_207_MULTI_STATUS if result.errors else status.HTTP_201_CREATED
+        return Response(result.as_dict(), status=response_status)
+
+    @action(detail=False, renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request, format=None):
+        """
+        Stream every matching activity as CSV (default) or NDJSON.
+
+        Accepts the ``user_id``, ``team_id``, ``activity_type``, ``start``
+        and ``end`` filters of the stats endpoints; ``gzip=1`` compresses
+        the download on the fly.
+        """
+        filters = stats.parse_filters(request.query_params)
+        filters.pop('period')
+        query = stats.match_stage(**filters)['$match']
+        renderer = request.accepted_renderer
+        chunks = export.FORMATS[renderer.format](export.iter_batches(query))
+        filename = f'activities.{renderer.format}'
+        content_type = renderer.media_type
+        if request.query_params.get('gzip') in ('1', 'true'):
+            chunks = export.gzipped(chunks)
+            filename += '.gz'
+            content_type = 'application/gzip'
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class LeaderboardViewSet(ConditionalGetMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = Leaderboard.objects.all().order_by('rank')
     serializer_class = LeaderboardSerializer
+    pagination_class = LeaderboardPagination
+
+    @action(detail=False)
+    def top(self, request):
+        """
+        The top ``n`` entries (default 10), overall or for one ``team_id``.
+
+        Served from the leaderboard cache; unpaginated.
+        """
+        return self.conditional_response(request, self.top_response)
+
+    def top_response(self, request):
+        (version,) = self.collection_versions
+        data = leaderboard_cache.top(version, self.get_top_n(request), request.query_params.get('team_id'))
+        return Response(data)
+
+    @action(detail=False)
+    def window(self, request):
+        """
+        The top ``n`` users (default 10) over a time ``window``: the
+        current UTC ``week`` or ``month``, or the rolling ``7d`` or ``30d``
+        up to today.
 
+        Ranked from the per-period buckets; unpaginated.
+        """
+        window = request.query_params.get('window', 'week')
+        if window not in leaderboard_periods.WINDOWS:
+            raise ValidationError({'window': [f"Must be one of: {', '.join(leaderboard_periods.WINDOWS)}."]})
+        return Response(leaderboard_periods.standings(window, self.get_top_n(request)))
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+    def get_top_n(self, request):
+        try:
+            n = int(request.query_params.get('n', TOP_DEFAULT))
+        except ValueError:
+            raise ValidationError({'n': ['Expected an integer.']})
+        if not 1 <= n <= settings.OCTOFIT_LEADERBOARD_TOP_N:
+            raise ValidationError({'n': [f'Must be between 1 and {settings.OCTOFIT_LEADERBOARD_TOP_N}.']})
+        return n
+
+
+class TeamLeaderboardViewSet(ConditionalGetMixin, FastReadMixin, viewsets.ReadOnlyModelViewSet):
+    """Team standings, kept up to date by team_leaderboard.py on every activity and membership change"""
+    queryset = TeamLeaderboard.objects.all().order_by('rank')
+    serializer_class = TeamLeaderboardSerializer
+    pagination_class = LeaderboardPagination
+
+
+class WorkoutViewSet(ConditionalGetMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
+
+
+class StatsViewSet(viewsets.ViewSet):
+    """
+    Activity totals grouped per user, team or activity type.
+
+    Accepts ``period`` (day, week or month), ``start`` and ``end`` dates,
+    and ``user_id``, ``team_id`` or ``activity_type`` filters.
+    """
+
+    def list(self, request, format=None):
+        return Response({
+            'users': reverse('stats-users', request=request, format=format),
+            'teams': reverse('stats-teams', request=request, format=format),
+            'activity_types': reverse('stats-activity-types', request=request, format=format),
+            'daily': reverse('stats-daily', request=request, format=format),
+        })
+
+    @action(detail=False)
+    def users(self, request):
+        return Response(stats.by_user(**stats.parse_filters(request.query_params)))
+
+    @action(detail=False)
+    def teams(self, request):
+        return Response(stats.by_team(**stats.parse_filters(request.query_params)))
+
+    @action(detail=False, url_path='activity-types', url_name='activity-types')
+    def activity_types(self, request):
+        return Response(stats.by_activity_type(**stats.parse_filters(request.query_params)))
+
+    @action(detail=False)
+    def daily(self, request):
+        """One user's per-day, per-activity-type totals, read from the rollups"""
+        filters = stats.parse_filters(request.query_params)
+        if not filters['user_id']:
+            raise ValidationError({'user_id': ['This filter is required.']})
+        return Response(rollups.daily(
+            filters['user_id'], start=filters['start'], end=filters['end'],
+            activity_type=filters['activity_type'], period=filters['period'],
+        ))
+
+
+@api_view(['GET'])
+def metrics_view(request, format=None):
+    """Counters, timings and gauges collected by this worker process"""
+    return Response(metrics.snapshot())
+
+
+@api_view(['GET'])
+def leaderboard_stream_view(request, format=None):
+    """
+    Stand-in for the leaderboard event stream outside ASGI.
+
+    The stream is answered in front of Django by ``live.route`` (see
+    ``asgi.py``); under WSGI or ``runserver`` this route keeps the path
+    from reaching the leaderboard's detail route as a lookup of "stream".
+    """
+    return Response(
+        {'detail': 'The leaderboard stream is only served by the ASGI application (octofit_tracker.asgi).'},
+        status=status.HTTP_404_NOT_FOUND,
+    )
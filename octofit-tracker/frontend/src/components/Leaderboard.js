@@ -6,7 +6,8 @@ function Leaderboard() {
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/leaderboard/`;
+    const baseUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/leaderboard`;
+    const apiUrl = `${baseUrl}/top/?n=100`;
     console.log('Leaderboard - Fetching from:', apiUrl);
 
     fetch(apiUrl)
@@ -29,6 +30,27 @@ function Leaderboard() {
         setError(error.message);
         setLoading(false);
       });
+
+    // Live rank changes; only served when the backend runs under ASGI.
+    // The browser reconnects on its own if the stream drops.
+    if (!window.EventSource) {
+      return undefined;
+    }
+    const events = new EventSource(`${baseUrl}/stream/`);
+    events.addEventListener('snapshot', event => {
+      setLeaderboard(JSON.parse(event.data));
+      setLoading(false);
+    });
+    events.addEventListener('delta', event => {
+      const { changed, removed } = JSON.parse(event.data);
+      setLeaderboard(current => {
+        const entries = new Map(current.map(entry => [entry.user_id, entry]));
+        removed.forEach(userId => entries.delete(userId));
+        changed.forEach(entry => entries.set(entry.user_id, entry));
+        return Array.from(entries.values()).sort((a, b) => a.rank - b.rank);
+      });
+    });
+    return () => events.close();
   }, []);
 
   if (loading) {